@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import multiprocessing as mp
+from datetime import datetime
+
+import numpy as np
+
+from models_scratch import (
+    SGDRegressorScratch,
+    RidgeRegression,
+    LassoRegressionScratch,
+    ElasticRegressionScratch,
+)
+
+r_seed = 42
+
+# mismo learning rate para todos los solvers iterativos y épocas como el
+# mínimo de param_grid del notebook (500), para comparar modelos convergidos
+LEARNING_RATE = 0.01
+DEFAULT_EPOCHS = 500
+# desviación del ruido de make_synthetic_obt: RMSE de un modelo perfecto
+NOISE_STD = 2.0
+
+MODELS = [
+    "SGDRegressorScratch", "RidgeRegression", "LassoRegressionScratch", "ElasticRegressionScratch",
+    "SGDRegressor", "Ridge", "Lasso", "ElasticNet",
+]
+
+# variables numéricas y categóricas como en ml_total_amount_regression.ipynb,
+# con una cardinalidad parecida a la de la OBT
+NUM_COLS = ["TRIP_DISTANCE", "PASSENGER_COUNT", "PICKUP_HOUR", "DAY_OF_WEEK", "MONTH", "YEAR"]
+CAT_LEVELS = {
+    "SOURCE_SERVICE": 2,
+    "VENDOR_NAME": 4,
+    "RATE_CODE_DESC": 7,
+    "PU_BOROUGH": 7,
+    "PU_ZONE": 263,
+    "PAYMENT_TYPE_DESC": 7,
+    "TRIP_TYPE_DESC": 3,
+    "STORE_AND_FWD_FLAG": 3,
+}
+
+
+def model_factories(n_epochs):
+    # un punto representativo del param_grid del notebook por modelo
+    from sklearn.linear_model import SGDRegressor, Ridge, Lasso, ElasticNet
+
+    return {
+        "SGDRegressorScratch": lambda: SGDRegressorScratch(learning_rate=LEARNING_RATE, n_epochs=n_epochs,
+                                                           alpha=0.001),
+        "RidgeRegression": lambda: RidgeRegression(learning_rate=LEARNING_RATE, n_epochs=n_epochs,
+                                                   l2_penality=0.01),
+        "LassoRegressionScratch": lambda: LassoRegressionScratch(learning_rate=LEARNING_RATE, n_epochs=n_epochs,
+                                                                 l1_penalty=0.01),
+        "ElasticRegressionScratch": lambda: ElasticRegressionScratch(alpha=0.01, l1_ratio=0.5,
+                                                                     learning_rate=LEARNING_RATE, n_epochs=n_epochs),
+        # tol=None para que sklearn haga el mismo número de épocas
+        "SGDRegressor": lambda: SGDRegressor(learning_rate="constant", eta0=LEARNING_RATE, alpha=0.001,
+                                             penalty="l2", max_iter=n_epochs, tol=None, random_state=r_seed),
+        "Ridge": lambda: Ridge(alpha=0.01, random_state=r_seed),
+        "Lasso": lambda: Lasso(alpha=0.01, max_iter=n_epochs, random_state=r_seed),
+        "ElasticNet": lambda: ElasticNet(alpha=0.01, l1_ratio=0.5, max_iter=n_epochs, random_state=r_seed),
+    }
+
+
+def n_features():
+    return len(NUM_COLS) + sum(CAT_LEVELS.values())
+
+
+def make_synthetic_obt(n_rows, seed, dtype=np.float32):
+    """
+    Matriz ya codificada (numéricas estandarizadas + one-hot denso) con la
+    misma forma que X_train_final del notebook, y un TOTAL_AMOUNT sintético
+    que depende linealmente de ellas más ruido de desviación NOISE_STD.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_rows, n_features()), dtype=dtype)
+
+    num = np.column_stack([
+        rng.lognormal(mean=0.7, sigma=0.8, size=n_rows),   # TRIP_DISTANCE
+        rng.integers(1, 6, size=n_rows),                   # PASSENGER_COUNT
+        rng.integers(0, 24, size=n_rows),                  # PICKUP_HOUR
+        rng.integers(0, 7, size=n_rows),                   # DAY_OF_WEEK
+        rng.integers(1, 13, size=n_rows),                  # MONTH
+        rng.integers(2022, 2026, size=n_rows),             # YEAR
+    ]).astype(float)
+    y = 3.0 + 4.5 * num[:, 0] + 0.3 * num[:, 2] + rng.normal(0, NOISE_STD, size=n_rows)
+    X[:, :len(NUM_COLS)] = (num - num.mean(axis=0)) / num.std(axis=0)
+
+    offset = len(NUM_COLS)
+    rows = np.arange(n_rows)
+    for levels in CAT_LEVELS.values():
+        codes = rng.integers(0, levels, size=n_rows)
+        X[rows, offset + codes] = 1.0
+        y += rng.normal(0, 1.5, size=levels)[codes]
+        offset += levels
+    return X, y
+
+
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def x_size_mb(n_rows, dtype):
+    return n_rows * n_features() * np.dtype(dtype).itemsize / (1024 * 1024)
+
+
+def run_single(model_name, n_rows, n_val, n_epochs, seed, dtype, queue):
+    # corre en un proceso propio para que el pico de RSS sea solo de este caso
+    result = {"model": model_name, "n_rows": n_rows, "n_epochs": n_epochs}
+    try:
+        np.random.seed(seed)
+        # train y val salen de la misma llamada: mismos efectos por categoría
+        X, y = make_synthetic_obt(n_rows + n_val, seed, dtype)
+        X_train, y_train = X[:n_rows], y[:n_rows]
+        X_val, y_val = X[n_rows:], y[n_rows:]
+        result["n_features"] = X_train.shape[1]
+        result["dtype"] = str(X_train.dtype)
+        result["x_mb"] = x_size_mb(n_rows + n_val, dtype)
+        result["data_rss_mb"] = peak_rss_mb()
+
+        model = model_factories(n_epochs)[model_name]()
+        start_time = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start_time
+
+        # épocas efectivas: n_epochs en las propias, n_iter_ en sklearn si existe
+        epochs = getattr(model, "n_iter_", getattr(model, "n_epochs", None))
+        if epochs is not None:
+            epochs = int(np.max(epochs))
+
+        y_pred = model.predict(X_val)
+        result.update({
+            "status": "ok",
+            "fit_time_s": fit_time,
+            "epochs": epochs,
+            "time_per_epoch_s": fit_time / epochs if epochs else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "val_rmse": float(np.sqrt(np.mean((y_val - y_pred) ** 2))),
+        })
+    except MemoryError:
+        result.update({"status": "memory_error", "peak_rss_mb": peak_rss_mb()})
+    except Exception as e:
+        result.update({"status": "error", "error": repr(e)})
+    queue.put(result)
+
+
+def run_isolated(model_name, n_rows, n_val, n_epochs, seed, dtype, timeout):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_single, args=(model_name, n_rows, n_val, n_epochs, seed, dtype, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {"model": model_name, "n_rows": n_rows, "n_epochs": n_epochs, "status": "timeout"}
+    if queue.empty():
+        # el proceso murió sin reportar (p. ej. OOM killer)
+        return {"model": model_name, "n_rows": n_rows, "n_epochs": n_epochs, "status": "killed",
+                "exit_code": process.exitcode}
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de modelos propios vs scikit-learn sobre datos tipo OBT")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS, help="épocas / max_iter por modelo")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float32",
+                        help="tipo de la matriz X; los modelos propios la copian a float64 dentro de fit")
+    parser.add_argument("--val-rows", type=int, default=200_000)
+    parser.add_argument("--timeout", type=float, help="segundos máximos por caso")
+    parser.add_argument("--output", default="benchmark_report.json")
+    args = parser.parse_args()
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "noise_rmse": NOISE_STD,
+        "results": [],
+    }
+
+    for n_rows in args.sizes:
+        n_val = min(args.val_rows, max(n_rows // 5, 1))
+        print(f"{n_rows:,} filas: X ocupa {x_size_mb(n_rows + n_val, args.dtype):,.0f} MB en {args.dtype}")
+        for model_name in args.models:
+            print(f"{model_name} con {n_rows:,} filas...")
+            result = run_isolated(model_name, n_rows, n_val, args.epochs, r_seed, args.dtype, args.timeout)
+            report["results"].append(result)
+            if result["status"] == "ok":
+                per_epoch = result["time_per_epoch_s"]
+                per_epoch = f"{per_epoch:.3f}s/época" if per_epoch is not None else "sin épocas"
+                print(f"  fit {result['fit_time_s']:.2f}s, {per_epoch}, "
+                      f"pico RSS {result['peak_rss_mb']:.0f} MB, RMSE val {result['val_rmse']:.3f} (ruido {NOISE_STD})")
+            else:
+                print(f"  {result['status']}")
+
+            # se guarda después de cada caso para no perder resultados si se corta
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+
+    print(f"Reporte guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
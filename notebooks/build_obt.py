@@ -1,11 +1,15 @@
 import os
+import sys
+import shutil
+import json
 import argparse
+import tempfile
 import psycopg2
 import pandas as pd
 from dotenv import load_dotenv
 from datetime import datetime
 import time
- 
+
 load_dotenv()
 
 PG_HOST = os.getenv("PG_HOST")
@@ -16,6 +20,61 @@ PG_PASSWORD = os.getenv("PG_PASSWORD")
 PG_SCHEMA_RAW = os.getenv("PG_SCHEMA_RAW")
 PG_SCHEMA_ANALYTICS = os.getenv("PG_SCHEMA_ANALYTICS")
 
+OBT_TABLE_NAME = "obt_trips"
+SHADOW_TABLE_NAME = "obt_trips_shadow"
+OBT_TABLE = f"{PG_SCHEMA_ANALYTICS}.{OBT_TABLE_NAME}"
+SHADOW_TABLE = f"{PG_SCHEMA_ANALYTICS}.{SHADOW_TABLE_NAME}"
+VIEW_NAME = "obt_trips_view"
+VIEW = f"{PG_SCHEMA_ANALYTICS}.{VIEW_NAME}"
+RUNS_TABLE = f"{PG_SCHEMA_ANALYTICS}.obt_build_runs"
+STEPS_TABLE = f"{PG_SCHEMA_ANALYTICS}.obt_build_steps"
+
+YEAR_MIN = 2015
+YEAR_MAX = 2025
+SERVICES = ["yellow", "green"]
+MONTHS = list(range(1, 13))
+
+# catálogos de códigos: (código -> descripción, descripción por defecto)
+VENDORS = ({
+    1: "Creative Mobile Technologies, LLC",
+    2: "Curb Mobility, LLC",
+    6: "Myle Technologies Inc",
+    7: "Helix",
+}, "Not specified")
+RATE_CODES = ({
+    1: "Standard rate",
+    2: "JFK",
+    3: "Newark",
+    4: "Nassau or Westchester",
+    5: "Negotiated fare",
+    6: "Group ride",
+}, "Unknown")
+PAYMENT_TYPES = ({
+    0: "Flex Fare trip ",
+    1: "Credit card",
+    2: "Cash",
+    3: "No charge",
+    4: "Dispute",
+    5: "Unknown",
+    6: "Voided trip",
+}, "Not specified")
+TRIP_TYPES = ({
+    1: "Street-hall",
+    2: "Dispatch",
+}, "Unknown")
+
+# dimensiones del esquema compacto: tabla -> (columna código, columna descripción, catálogo)
+DIMENSIONS = {
+    "dim_vendor": ("vendor_id", "vendor_name", VENDORS),
+    "dim_rate_code": ("rate_code_id", "rate_code_desc", RATE_CODES),
+    "dim_payment_type": ("payment_type", "payment_type_desc", PAYMENT_TYPES),
+    "dim_trip_type": ("trip_type", "trip_type_desc", TRIP_TYPES),
+}
+
+# errores de conexión / timeout que vale la pena reintentar
+# (QueryCanceled por statement_timeout hereda de OperationalError)
+RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
 
 def get_connection():
     return psycopg2.connect(
@@ -27,271 +86,96 @@ def get_connection():
     )
 
 
+class RetryingConnection:
+    """
+    Conexión que se reabre sola si se cae.
+    run() ejecuta una acción dentro de una transacción y la reintenta con
+    backoff exponencial ante errores de conexión o timeout.
+    """
 
-parser = argparse.ArgumentParser(description="Build analytics.obt_trips table")
-parser.add_argument("--mode", choices=["full", "by-partition"], default="full")
-parser.add_argument("--year-start", type=int, required=True)
-parser.add_argument("--year-end", type=int, required=True)
-parser.add_argument("--services", nargs="+", choices=["yellow", "green"], required=True)
-parser.add_argument("--run-id", required=True)
-parser.add_argument("--overwrite", choices=["true", "false"], default="false")
-args = parser.parse_args()
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.conn = None
 
-if args.mode == "full":
-    args.overwrite = "true"
-    args.year_start = 2015
-    args.year_end = 2025
-    args.services = ["green", "yellow"]
-    
+    def _ensure_connection(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = get_connection()
+        return self.conn
 
-if args.services == "yellow":
-    print("Building OBT for yellow service only")
-    query = f"""
-        {"DROP TABLE IF EXISTS " + PG_SCHEMA_ANALYTICS + ".obt_trips;" if args.overwrite else ""}
+    def _discard_connection(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
 
-        CREATE TABLE IF NOT EXISTS {PG_SCHEMA_ANALYTICS}.obt_trips AS
-        WITH yellow AS (
-            SELECT
-                "RUN_ID",
-                "VENDORID",
-                "TPEP_PICKUP_DATETIME" AS "PICKUP_DATETIME",
-                "TPEP_DROPOFF_DATETIME" AS "DROPOFF_DATETIME",
-                "PASSENGER_COUNT",
-                "TRIP_DISTANCE",
-                "RATECODEID" AS "RATECODEID",
-                "STORE_AND_FWD_FLAG",
-                "PULOCATIONID",
-                "DOLOCATIONID",
-                "PAYMENT_TYPE" AS "PAYMENT_TYPE",
-                "FARE_AMOUNT",
-                "EXTRA",
-                "MTA_TAX",
-                "TIP_AMOUNT",
-                "TOLLS_AMOUNT",
-                "IMPROVEMENT_SURCHARGE",
-                "TOTAL_AMOUNT",
-                "CONGESTION_SURCHARGE",
-                "AIRPORT_FEE",
-                "CBD_CONGESTION_FEE",
-                NULL::integer AS "EHAIL_FEE",
-                NULL::double precision AS "TRIP_TYPE",
-                "SERVICE_TYPE",
-                "SOURCE_YEAR",
-                "SOURCE_MONTH",
-                "INGESTED_AT_UTC",
-                "SOURCE_PATH"
-            FROM {PG_SCHEMA_RAW}.yellow_trips
-            WHERE "SOURCE_YEAR" BETWEEN %s AND %s
-        ),
-        -- Estandarización de zonas horarias y normalización
-        standardized_trips as (
-            select
-                *,
-                -- Estandarizar zonas horarias
-                (("PICKUP_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "PICKUP_DATETIME_EST",
-                (("DROPOFF_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "DROPOFF_DATETIME_EST",
-                -- Normalizar
-                case "VENDORID"
-                    when 1 then 'Creative Mobile Technologies, LLC'
-                    when 2 then 'Curb Mobility, LLC'
-                    when 6 then 'Myle Technologies Inc'
-                    when 7 then 'Helix'
-                    else 'Not specified'
-                end as "VENDORID_DESC",
-
-                case "RATECODEID"
-                    when 1 then 'Standard rate'
-                    when 2 then 'JFK'
-                    when 3 then 'Newark'
-                    when 4 then 'Nassau or Westchester'
-                    when 5 then 'Negotiated fare'
-                    when 6 then 'Group ride'
-                    else 'Unknown'
-                end as "RATECODE_DESC",
-
-                case "PAYMENT_TYPE"
-                    when 0 then 'Flex Fare trip '
-                    when 1 then 'Credit card'
-                    when 2 then 'Cash'
-                    when 3 then 'No charge'
-                    when 4 then 'Dispute'
-                    when 5 then 'Unknown'
-                    when 6 then 'Voided trip'
-                    else 'Not specified'
-                end as "PAYMENT_TYPE_DESC",
-
-                case "TRIP_TYPE"
-                    when 1 then 'Street-hall'
-                    when 2 then 'Dispatch'
-                    else 'Unknown'
-                end as "TRIP_TYPE_DESC",
-
-                case "STORE_AND_FWD_FLAG"
-                    when 'Y' then 'Yes'
-                    when 'N' then 'No'
-                    else 'Unknown'
-                end as "STORE_AND_FWD_FLAG_DESC",
-                
-                -- Duración del viaje en minutos
-                EXTRACT(EPOCH FROM ("DROPOFF_DATETIME" - "PICKUP_DATETIME")) / 60 AS "TRIP_DURATION_MINUTES"
-            FROM yellow
-        ),
-        -- Enriquecer con Taxi Zones
-        enriched_with_zones as (
-            SELECT
-                st.*,
-                -- Información de pickup location
-                pz."Zone" as "PICKUP_ZONE",
-                pz."Borough" as "PICKUP_BOROUGH",
-                pz."service_zone" as "PICKUP_SERVICE_ZONE",
-
-                -- Información de dropoff location
-                dz."Zone" as "DROPOFF_ZONE",
-                dz."Borough" as "DROPOFF_BOROUGH",
-                dz."service_zone" as "DROPOFF_SERVICE_ZONE"
-
-            from standardized_trips st
-            left join RAW.taxi_zones pz 
-                on st."PULOCATIONID" = pz."LocationID"
-            left join RAW.taxi_zones dz 
-                on st."DOLOCATIONID" = dz."LocationID"
-        ),
-        -- Métricas adicionales y limpieza final
-        final as (
-            select
-                -- Identificadores y metadatos
-                "RUN_ID",
-                "INGESTED_AT_UTC",
-                "SERVICE_TYPE",
-                        
-                -- Fechas y tiempos
-                "SOURCE_YEAR",
-                "SOURCE_MONTH",
-                "PICKUP_DATETIME_EST" as "PICKUP_DATETIME",
-                "DROPOFF_DATETIME_EST" as "DROPOFF_DATETIME",
-                "TRIP_DURATION_MINUTES",
-                
-                -- Datos del viaje
-
-                "VENDORID",
-                "VENDORID_DESC",
-                "PASSENGER_COUNT",
-                "TRIP_DISTANCE",
-                "RATECODEID",
-                "RATECODE_DESC",
-                "STORE_AND_FWD_FLAG_DESC",
-
-                -- Información de ubicación
-                "PULOCATIONID",
-                "PICKUP_ZONE",
-                "PICKUP_BOROUGH",
-                "PICKUP_SERVICE_ZONE",
-                
-                "DOLOCATIONID", 
-                "DROPOFF_ZONE",
-                "DROPOFF_BOROUGH",
-                "DROPOFF_SERVICE_ZONE",
-                
-                -- Información de pago
-                "PAYMENT_TYPE",
-                "PAYMENT_TYPE_DESC",
-                "FARE_AMOUNT",
-                "TIP_AMOUNT",
-                "EXTRA",
-                "MTA_TAX",
-                "TOLLS_AMOUNT",
-                "IMPROVEMENT_SURCHARGE",
-                "CONGESTION_SURCHARGE",
-                "CBD_CONGESTION_FEE",
-                "EHAIL_FEE",
-                "TOTAL_AMOUNT",
-                "AIRPORT_FEE",
-                
-                -- Campos específicos
-                "TRIP_TYPE",
-                "TRIP_TYPE_DESC"
-            from enriched_with_zones
-        )
-        SELECT
-            -- tiempo
-            "PICKUP_DATETIME",
-            "DROPOFF_DATETIME",
-            CAST("PICKUP_DATETIME" AS date) AS "PICKUP_DATE",
-            EXTRACT(HOUR FROM "PICKUP_DATETIME") AS "PICKUP_HOUR",
-            CAST("DROPOFF_DATETIME" AS date) AS "DROPOFF_DATE",
-            EXTRACT(HOUR FROM "DROPOFF_DATETIME") AS "DROPOFF_HOUR",
-            EXTRACT(DOW FROM "PICKUP_DATETIME") AS "DAY_OF_WEEK",
-            EXTRACT(MONTH FROM "PICKUP_DATETIME") AS "MONTH",
-            EXTRACT(YEAR FROM "PICKUP_DATETIME") AS "YEAR",
+    def backoff_delay(self, attempt):
+        return min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
 
-            -- ubicacion
-            "PULOCATIONID" AS "PU_LOCATION_ID",
-            "PICKUP_ZONE" AS "PU_ZONE",
-            "PICKUP_BOROUGH" AS "PU_BOROUGH",
-            "DOLOCATIONID" AS "DO_LOCATION_ID",
-            "DROPOFF_ZONE" AS "DO_ZONE",
-            "DROPOFF_BOROUGH" AS "DO_BOROUGH",
+    def run(self, action, description):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                conn = self._ensure_connection()
+                with conn.cursor() as cur:
+                    result = action(cur)
+                conn.commit()
+                return result
+            except RETRYABLE_ERRORS as e:
+                self._discard_connection()
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"Error en {description} (intento {attempt}/{self.max_attempts}): {e}")
+                print(f"Reintentando en {delay:.0f}s...")
+                time.sleep(delay)
+            except Exception:
+                if self.conn is not None and not self.conn.closed:
+                    self.conn.rollback()
+                raise
 
-            -- servicios y codigos
-            "SERVICE_TYPE",
-            "VENDORID" AS "VENDOR_ID",
-            "VENDORID_DESC" AS "VENDOR_NAME",
-            "RATECODEID" AS "RATE_CODE_ID",
-            "RATECODE_DESC" AS "RATE_CODE_DESC",
-            "PAYMENT_TYPE",
-            "PAYMENT_TYPE_DESC",
-            "TRIP_TYPE",
-            "TRIP_TYPE_DESC",
+    def close(self):
+        self._discard_connection()
 
-            -- viaje
-            "PASSENGER_COUNT",
-            "TRIP_DISTANCE",
-            "STORE_AND_FWD_FLAG_DESC" AS "STORE_AND_FWD_FLAG",
 
-            -- tarifas
-            "FARE_AMOUNT",
-            "EXTRA",
-            "MTA_TAX",
-            "TIP_AMOUNT",
-            "TOLLS_AMOUNT",
-            "IMPROVEMENT_SURCHARGE",
-            "CONGESTION_SURCHARGE",
-            "AIRPORT_FEE",
-            "TOTAL_AMOUNT",
+def case_sql(column, catalog):
+    codes, default = catalog
+    whens = "\n".join(f"                when {code} then '{desc}'" for code, desc in codes.items())
+    return f"""case "{column}"
+{whens}
+                else '{default}'
+            end"""
 
-            -- derivadas
-            "TRIP_DURATION_MINUTES" AS "TRIP_DURATION_MIN",
-            CASE 
-                WHEN "TRIP_DURATION_MINUTES" > 0 
-                THEN ("TRIP_DISTANCE" / ("TRIP_DURATION_MINUTES" / 60)) 
-                ELSE NULL 
-            END AS "AVG_SPEED_MPH",
-            CASE 
-                WHEN "TOTAL_AMOUNT" > 0 
-                THEN ("TIP_AMOUNT" / "TOTAL_AMOUNT") * 100 
-                ELSE NULL 
-            END AS "TIP_PCT",
 
-            -- lineage
-            "RUN_ID",
-            "INGESTED_AT_UTC",
-            "SERVICE_TYPE" AS "SOURCE_SERVICE",
-            "SOURCE_YEAR",
-            "SOURCE_MONTH"
-        FROM final;
-        """
-elif args.services == "green":
-    print("Building OBT for green service only")
-    query = f"""
-    {"DROP TABLE IF EXISTS " + PG_SCHEMA_ANALYTICS + ".obt_trips;" if args.overwrite else ""}
-
-    CREATE TABLE IF NOT EXISTS {PG_SCHEMA_ANALYTICS}.obt_trips AS
-    WITH green AS (
+def source_cte(service, relation=None):
+    # columnas crudas de cada servicio llevadas a un esquema común.
+    # Por defecto lee una partición (año, mes) de la tabla raw en Postgres;
+    # con relation lee esa relación completa (motor DuckDB)
+    if service == "yellow":
+        pickup, dropoff = "TPEP_PICKUP_DATETIME", "TPEP_DROPOFF_DATETIME"
+        airport_fee = '"AIRPORT_FEE"'
+        ehail_fee = 'NULL::double precision AS "EHAIL_FEE"'
+        trip_type = 'NULL::double precision AS "TRIP_TYPE"'
+    else:
+        pickup, dropoff = "LPEP_PICKUP_DATETIME", "LPEP_DROPOFF_DATETIME"
+        airport_fee = 'NULL::double precision AS "AIRPORT_FEE"'
+        ehail_fee = '"EHAIL_FEE"'
+        trip_type = '"TRIP_TYPE"'
+
+    if relation is None:
+        source_from = f'''FROM {PG_SCHEMA_RAW}.{service}_trips
+        WHERE "SOURCE_YEAR" = %s AND "SOURCE_MONTH" = %s'''
+    else:
+        source_from = f"FROM {relation}"
+
+    return f"""
         SELECT
             "RUN_ID",
             "VENDORID",
-            "LPEP_PICKUP_DATETIME" AS "PICKUP_DATETIME",
-            "LPEP_DROPOFF_DATETIME" AS "DROPOFF_DATETIME",
+            "{pickup}" AS "PICKUP_DATETIME",
+            "{dropoff}" AS "DROPOFF_DATETIME",
             "PASSENGER_COUNT",
             "TRIP_DISTANCE",
             "RATECODEID" AS "RATECODEID",
@@ -307,17 +191,27 @@ elif args.services == "green":
             "IMPROVEMENT_SURCHARGE",
             "TOTAL_AMOUNT",
             "CONGESTION_SURCHARGE",
-            NULL::integer AS "AIRPORT_FEE",
+            {airport_fee},
             "CBD_CONGESTION_FEE",
-            "EHAIL_FEE",
-            "TRIP_TYPE",
+            {ehail_fee},
+            {trip_type},
             "SERVICE_TYPE",
             "SOURCE_YEAR",
             "SOURCE_MONTH",
             "INGESTED_AT_UTC",
             "SOURCE_PATH"
-        FROM {PG_SCHEMA_RAW}.green_trips
-        WHERE "SOURCE_YEAR" BETWEEN %s AND %s
+        {source_from}
+    """
+
+
+def obt_select(service, compact=False, relation=None, zones=None):
+    """SELECT de la OBT para una partición (service, year, month) de raw."""
+    if compact:
+        return compact_obt_select(service, relation)
+    zones = zones or f"{PG_SCHEMA_RAW}.taxi_zones"
+    return f"""
+    WITH trips AS (
+        {source_cte(service, relation)}
     ),
     -- Estandarización de zonas horarias y normalización
     standardized_trips as (
@@ -327,50 +221,23 @@ elif args.services == "green":
             (("PICKUP_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "PICKUP_DATETIME_EST",
             (("DROPOFF_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "DROPOFF_DATETIME_EST",
             -- Normalizar
-            case "VENDORID"
-                when 1 then 'Creative Mobile Technologies, LLC'
-                when 2 then 'Curb Mobility, LLC'
-                when 6 then 'Myle Technologies Inc'
-                when 7 then 'Helix'
-                else 'Not specified'
-            end as "VENDORID_DESC",
-
-            case "RATECODEID"
-                when 1 then 'Standard rate'
-                when 2 then 'JFK'
-                when 3 then 'Newark'
-                when 4 then 'Nassau or Westchester'
-                when 5 then 'Negotiated fare'
-                when 6 then 'Group ride'
-                else 'Unknown'
-            end as "RATECODE_DESC",
-
-            case "PAYMENT_TYPE"
-                when 0 then 'Flex Fare trip '
-                when 1 then 'Credit card'
-                when 2 then 'Cash'
-                when 3 then 'No charge'
-                when 4 then 'Dispute'
-                when 5 then 'Unknown'
-                when 6 then 'Voided trip'
-                else 'Not specified'
-            end as "PAYMENT_TYPE_DESC",
-
-            case "TRIP_TYPE"
-                when 1 then 'Street-hall'
-                when 2 then 'Dispatch'
-                else 'Unknown'
-            end as "TRIP_TYPE_DESC",
+            {case_sql("VENDORID", VENDORS)} as "VENDORID_DESC",
+
+            {case_sql("RATECODEID", RATE_CODES)} as "RATECODE_DESC",
+
+            {case_sql("PAYMENT_TYPE", PAYMENT_TYPES)} as "PAYMENT_TYPE_DESC",
+
+            {case_sql("TRIP_TYPE", TRIP_TYPES)} as "TRIP_TYPE_DESC",
 
             case "STORE_AND_FWD_FLAG"
                 when 'Y' then 'Yes'
                 when 'N' then 'No'
                 else 'Unknown'
             end as "STORE_AND_FWD_FLAG_DESC",
-            
+
             -- Duración del viaje en minutos
             EXTRACT(EPOCH FROM ("DROPOFF_DATETIME" - "PICKUP_DATETIME")) / 60 AS "TRIP_DURATION_MINUTES"
-        FROM green
+        FROM trips
     ),
     -- Enriquecer con Taxi Zones
     enriched_with_zones as (
@@ -387,9 +254,9 @@ elif args.services == "green":
             dz."service_zone" as "DROPOFF_SERVICE_ZONE"
 
         from standardized_trips st
-        left join RAW.taxi_zones pz 
+        left join {zones} pz
             on st."PULOCATIONID" = pz."LocationID"
-        left join RAW.taxi_zones dz 
+        left join {zones} dz
             on st."DOLOCATIONID" = dz."LocationID"
     ),
     -- Métricas adicionales y limpieza final
@@ -399,14 +266,14 @@ elif args.services == "green":
             "RUN_ID",
             "INGESTED_AT_UTC",
             "SERVICE_TYPE",
-                    
+
             -- Fechas y tiempos
             "SOURCE_YEAR",
             "SOURCE_MONTH",
             "PICKUP_DATETIME_EST" as "PICKUP_DATETIME",
             "DROPOFF_DATETIME_EST" as "DROPOFF_DATETIME",
             "TRIP_DURATION_MINUTES",
-            
+
             -- Datos del viaje
 
             "VENDORID",
@@ -422,12 +289,12 @@ elif args.services == "green":
             "PICKUP_ZONE",
             "PICKUP_BOROUGH",
             "PICKUP_SERVICE_ZONE",
-            
-            "DOLOCATIONID", 
+
+            "DOLOCATIONID",
             "DROPOFF_ZONE",
             "DROPOFF_BOROUGH",
             "DROPOFF_SERVICE_ZONE",
-            
+
             -- Información de pago
             "PAYMENT_TYPE",
             "PAYMENT_TYPE_DESC",
@@ -442,7 +309,7 @@ elif args.services == "green":
             "EHAIL_FEE",
             "TOTAL_AMOUNT",
             "AIRPORT_FEE",
-            
+
             -- Campos específicos
             "TRIP_TYPE",
             "TRIP_TYPE_DESC"
@@ -497,15 +364,15 @@ elif args.services == "green":
 
         -- derivadas
         "TRIP_DURATION_MINUTES" AS "TRIP_DURATION_MIN",
-        CASE 
-            WHEN "TRIP_DURATION_MINUTES" > 0 
-            THEN ("TRIP_DISTANCE" / ("TRIP_DURATION_MINUTES" / 60)) 
-            ELSE NULL 
+        CASE
+            WHEN "TRIP_DURATION_MINUTES" > 0
+            THEN ("TRIP_DISTANCE" / ("TRIP_DURATION_MINUTES" / 60))
+            ELSE NULL
         END AS "AVG_SPEED_MPH",
-        CASE 
-            WHEN "TOTAL_AMOUNT" > 0 
-            THEN ("TIP_AMOUNT" / "TOTAL_AMOUNT") * 100 
-            ELSE NULL 
+        CASE
+            WHEN "TOTAL_AMOUNT" > 0
+            THEN ("TIP_AMOUNT" / "TOTAL_AMOUNT") * 100
+            ELSE NULL
         END AS "TIP_PCT",
 
         -- lineage
@@ -514,305 +381,864 @@ elif args.services == "green":
         "SERVICE_TYPE" AS "SOURCE_SERVICE",
         "SOURCE_YEAR",
         "SOURCE_MONTH"
-    FROM final;
+    FROM final
     """
 
 
-else:
-    print("Building OBT for both services: yellow and green")
-    query = f"""
-    {"DROP TABLE IF EXISTS " + PG_SCHEMA_ANALYTICS + ".obt_trips;" if args.overwrite else ""}
+# ---------------------------------------------------------------------------
+# Esquema compacto
+# ---------------------------------------------------------------------------
 
-    CREATE TABLE IF NOT EXISTS {PG_SCHEMA_ANALYTICS}.obt_trips AS
-    WITH yellow AS (
-        SELECT
-            "RUN_ID",
-            "VENDORID",
-            "TPEP_PICKUP_DATETIME" AS "PICKUP_DATETIME",
-            "TPEP_DROPOFF_DATETIME" AS "DROPOFF_DATETIME",
-            "PASSENGER_COUNT",
-            "TRIP_DISTANCE",
-            "RATECODEID" AS "RATECODEID",
-            "STORE_AND_FWD_FLAG",
-            "PULOCATIONID",
-            "DOLOCATIONID",
-            "PAYMENT_TYPE" AS "PAYMENT_TYPE",
-            "FARE_AMOUNT",
-            "EXTRA",
-            "MTA_TAX",
-            "TIP_AMOUNT",
-            "TOLLS_AMOUNT",
-            "IMPROVEMENT_SURCHARGE",
-            "TOTAL_AMOUNT",
-            "CONGESTION_SURCHARGE",
-            "AIRPORT_FEE",
-            "CBD_CONGESTION_FEE",
-            NULL::integer AS "EHAIL_FEE",
-            NULL::double precision AS "TRIP_TYPE",
-            "SERVICE_TYPE",
-            "SOURCE_YEAR",
-            "SOURCE_MONTH",
-            "INGESTED_AT_UTC",
-            "SOURCE_PATH"
-        FROM {PG_SCHEMA_RAW}.yellow_trips
-        WHERE "SOURCE_YEAR" BETWEEN %s AND %s
-    ),
-    green AS (
-        SELECT
-            "RUN_ID",
-            "VENDORID",
-            "LPEP_PICKUP_DATETIME" AS "PICKUP_DATETIME",
-            "LPEP_DROPOFF_DATETIME" AS "DROPOFF_DATETIME",
-            "PASSENGER_COUNT",
-            "TRIP_DISTANCE",
-            "RATECODEID" AS "RATECODEID",
-            "STORE_AND_FWD_FLAG",
-            "PULOCATIONID",
-            "DOLOCATIONID",
-            "PAYMENT_TYPE" AS "PAYMENT_TYPE",
-            "FARE_AMOUNT",
-            "EXTRA",
-            "MTA_TAX",
-            "TIP_AMOUNT",
-            "TOLLS_AMOUNT",
-            "IMPROVEMENT_SURCHARGE",
-            "TOTAL_AMOUNT",
-            "CONGESTION_SURCHARGE",
-            NULL::integer AS "AIRPORT_FEE",
-            "CBD_CONGESTION_FEE",
-            "EHAIL_FEE",
-            "TRIP_TYPE",
-            "SERVICE_TYPE",
-            "SOURCE_YEAR",
-            "SOURCE_MONTH",
-            "INGESTED_AT_UTC",
-            "SOURCE_PATH"
-        FROM {PG_SCHEMA_RAW}.green_trips
-        WHERE "SOURCE_YEAR" BETWEEN %s AND %s
-    ),
-    unioned_trips AS (
-        SELECT * FROM yellow
-        UNION ALL
-        SELECT * FROM green
+def compact_obt_select(service, relation=None):
+    """
+    Variante angosta de la OBT: tipos chicos, solo códigos y columnas
+    ordenadas de mayor a menor alineación (8, 4, 2, 1 bytes y luego texto)
+    para no desperdiciar padding. Las descripciones salen de obt_trips_view.
+    """
+    return f"""
+    WITH trips AS (
+        {source_cte(service, relation)}
     ),
-    -- Estandarización de zonas horarias y normalización
     standardized_trips as (
         select
             *,
-            -- Estandarizar zonas horarias
             (("PICKUP_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "PICKUP_DATETIME_EST",
             (("DROPOFF_DATETIME" AT TIME ZONE 'UTC') AT TIME ZONE 'America/New_York') AS "DROPOFF_DATETIME_EST",
-            -- Normalizar
-            case "VENDORID"
-                when 1 then 'Creative Mobile Technologies, LLC'
-                when 2 then 'Curb Mobility, LLC'
-                when 6 then 'Myle Technologies Inc'
-                when 7 then 'Helix'
-                else 'Not specified'
-            end as "VENDORID_DESC",
-
-            case "RATECODEID"
-                when 1 then 'Standard rate'
-                when 2 then 'JFK'
-                when 3 then 'Newark'
-                when 4 then 'Nassau or Westchester'
-                when 5 then 'Negotiated fare'
-                when 6 then 'Group ride'
-                else 'Unknown'
-            end as "RATECODE_DESC",
-
-            case "PAYMENT_TYPE"
-                when 0 then 'Flex Fare trip '
-                when 1 then 'Credit card'
-                when 2 then 'Cash'
-                when 3 then 'No charge'
-                when 4 then 'Dispute'
-                when 5 then 'Unknown'
-                when 6 then 'Voided trip'
-                else 'Not specified'
-            end as "PAYMENT_TYPE_DESC",
-
-            case "TRIP_TYPE"
-                when 1 then 'Street-hall'
-                when 2 then 'Dispatch'
-                else 'Unknown'
-            end as "TRIP_TYPE_DESC",
-
-            case "STORE_AND_FWD_FLAG"
-                when 'Y' then 'Yes'
-                when 'N' then 'No'
-                else 'Unknown'
-            end as "STORE_AND_FWD_FLAG_DESC",
-            
-            -- Duración del viaje en minutos
             EXTRACT(EPOCH FROM ("DROPOFF_DATETIME" - "PICKUP_DATETIME")) / 60 AS "TRIP_DURATION_MINUTES"
-        FROM unioned_trips
-    ),
-    -- Enriquecer con Taxi Zones
-    enriched_with_zones as (
+        FROM trips
+    )
+    SELECT
+        -- 8 bytes
+        "PICKUP_DATETIME_EST" AS "PICKUP_DATETIME",
+        "DROPOFF_DATETIME_EST" AS "DROPOFF_DATETIME",
+        "INGESTED_AT_UTC",
+
+        -- 4 bytes
+        CAST("PICKUP_DATETIME_EST" AS date) AS "PICKUP_DATE",
+        CAST("DROPOFF_DATETIME_EST" AS date) AS "DROPOFF_DATE",
+        "TRIP_DISTANCE"::real AS "TRIP_DISTANCE",
+        "FARE_AMOUNT"::real AS "FARE_AMOUNT",
+        "EXTRA"::real AS "EXTRA",
+        "MTA_TAX"::real AS "MTA_TAX",
+        "TIP_AMOUNT"::real AS "TIP_AMOUNT",
+        "TOLLS_AMOUNT"::real AS "TOLLS_AMOUNT",
+        "IMPROVEMENT_SURCHARGE"::real AS "IMPROVEMENT_SURCHARGE",
+        "CONGESTION_SURCHARGE"::real AS "CONGESTION_SURCHARGE",
+        "AIRPORT_FEE"::real AS "AIRPORT_FEE",
+        "TOTAL_AMOUNT"::real AS "TOTAL_AMOUNT",
+        "TRIP_DURATION_MINUTES"::real AS "TRIP_DURATION_MIN",
+        CASE
+            WHEN "TRIP_DURATION_MINUTES" > 0
+            THEN ("TRIP_DISTANCE" / ("TRIP_DURATION_MINUTES" / 60))
+            ELSE NULL
+        END::real AS "AVG_SPEED_MPH",
+        CASE
+            WHEN "TOTAL_AMOUNT" > 0
+            THEN ("TIP_AMOUNT" / "TOTAL_AMOUNT") * 100
+            ELSE NULL
+        END::real AS "TIP_PCT",
+
+        -- 2 bytes
+        EXTRACT(YEAR FROM "PICKUP_DATETIME_EST")::smallint AS "YEAR",
+        EXTRACT(MONTH FROM "PICKUP_DATETIME_EST")::smallint AS "MONTH",
+        EXTRACT(DOW FROM "PICKUP_DATETIME_EST")::smallint AS "DAY_OF_WEEK",
+        EXTRACT(HOUR FROM "PICKUP_DATETIME_EST")::smallint AS "PICKUP_HOUR",
+        EXTRACT(HOUR FROM "DROPOFF_DATETIME_EST")::smallint AS "DROPOFF_HOUR",
+        "PULOCATIONID"::smallint AS "PU_LOCATION_ID",
+        "DOLOCATIONID"::smallint AS "DO_LOCATION_ID",
+        "VENDORID"::smallint AS "VENDOR_ID",
+        "RATECODEID"::smallint AS "RATE_CODE_ID",
+        "PAYMENT_TYPE"::smallint AS "PAYMENT_TYPE",
+        "TRIP_TYPE"::smallint AS "TRIP_TYPE",
+        "PASSENGER_COUNT"::smallint AS "PASSENGER_COUNT",
+        "SOURCE_YEAR"::smallint AS "SOURCE_YEAR",
+        "SOURCE_MONTH"::smallint AS "SOURCE_MONTH",
+
+        -- 1 byte (NULL = Unknown)
+        CASE "STORE_AND_FWD_FLAG" WHEN 'Y' THEN true WHEN 'N' THEN false END AS "STORE_AND_FWD_FLAG",
+
+        -- texto al final
+        "SERVICE_TYPE" AS "SOURCE_SERVICE",
+        "RUN_ID"
+    FROM standardized_trips
+    """
+
+
+def create_dimensions(cur, zones=None):
+    for table, (code_col, desc_col, (codes, _)) in DIMENSIONS.items():
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PG_SCHEMA_ANALYTICS}.{table} (
+                {code_col} smallint PRIMARY KEY,
+                {desc_col} text NOT NULL
+            );
+        """)
+        for code, desc in codes.items():
+            cur.execute(f"""
+                INSERT INTO {PG_SCHEMA_ANALYTICS}.{table} ({code_col}, {desc_col})
+                VALUES (%s, %s)
+                ON CONFLICT ({code_col}) DO UPDATE SET {desc_col} = EXCLUDED.{desc_col}
+            """, (code, desc))
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PG_SCHEMA_ANALYTICS}.dim_zone (
+            location_id  smallint PRIMARY KEY,
+            zone         text,
+            borough      text,
+            service_zone text
+        );
+    """)
+    upsert_zone = f"""
+        ON CONFLICT (location_id) DO UPDATE
+        SET zone = EXCLUDED.zone,
+            borough = EXCLUDED.borough,
+            service_zone = EXCLUDED.service_zone
+    """
+    if zones is None:
+        cur.execute(f"""
+            INSERT INTO {PG_SCHEMA_ANALYTICS}.dim_zone (location_id, zone, borough, service_zone)
+            SELECT "LocationID"::smallint, "Zone", "Borough", "service_zone"
+            FROM {PG_SCHEMA_RAW}.taxi_zones
+            {upsert_zone}
+        """)
+    else:
+        # zonas leídas del csv local (motor duckdb)
+        cur.executemany(f"""
+            INSERT INTO {PG_SCHEMA_ANALYTICS}.dim_zone (location_id, zone, borough, service_zone)
+            VALUES (%s, %s, %s, %s)
+            {upsert_zone}
+        """, zones)
+
+
+def publish_view(cur, compact):
+    """
+    obt_trips_view expone el esquema compacto con las mismas columnas que la
+    OBT ancha. Se recrea cada vez que cambia la tabla de la que depende.
+    """
+    cur.execute(f"DROP VIEW IF EXISTS {VIEW};")
+    if not compact:
+        return
+
+    def desc(table, alias):
+        _, desc_col, (_, default) = DIMENSIONS[table]
+        return f"COALESCE({alias}.{desc_col}, '{default}')"
+
+    cur.execute(f"""
+        CREATE VIEW {VIEW} AS
         SELECT
-            st.*,
-            -- Información de pickup location
-            pz."Zone" as "PICKUP_ZONE",
-            pz."Borough" as "PICKUP_BOROUGH",
-            pz."service_zone" as "PICKUP_SERVICE_ZONE",
+            -- tiempo
+            t."PICKUP_DATETIME",
+            t."DROPOFF_DATETIME",
+            t."PICKUP_DATE",
+            t."PICKUP_HOUR",
+            t."DROPOFF_DATE",
+            t."DROPOFF_HOUR",
+            t."DAY_OF_WEEK",
+            t."MONTH",
+            t."YEAR",
 
-            -- Información de dropoff location
-            dz."Zone" as "DROPOFF_ZONE",
-            dz."Borough" as "DROPOFF_BOROUGH",
-            dz."service_zone" as "DROPOFF_SERVICE_ZONE"
+            -- ubicacion
+            t."PU_LOCATION_ID",
+            pz.zone AS "PU_ZONE",
+            pz.borough AS "PU_BOROUGH",
+            t."DO_LOCATION_ID",
+            dz.zone AS "DO_ZONE",
+            dz.borough AS "DO_BOROUGH",
 
-        from standardized_trips st
-        left join RAW.taxi_zones pz 
-            on st."PULOCATIONID" = pz."LocationID"
-        left join RAW.taxi_zones dz 
-            on st."DOLOCATIONID" = dz."LocationID"
-    ),
-    -- Métricas adicionales y limpieza final
-    final as (
-        select
-            -- Identificadores y metadatos
-            "RUN_ID",
-            "INGESTED_AT_UTC",
-            "SERVICE_TYPE",
-                    
-            -- Fechas y tiempos
-            "SOURCE_YEAR",
-            "SOURCE_MONTH",
-            "PICKUP_DATETIME_EST" as "PICKUP_DATETIME",
-            "DROPOFF_DATETIME_EST" as "DROPOFF_DATETIME",
-            "TRIP_DURATION_MINUTES",
-            
-            -- Datos del viaje
+            -- servicios y codigos
+            t."SOURCE_SERVICE" AS "SERVICE_TYPE",
+            t."VENDOR_ID",
+            {desc("dim_vendor", "v")} AS "VENDOR_NAME",
+            t."RATE_CODE_ID",
+            {desc("dim_rate_code", "rc")} AS "RATE_CODE_DESC",
+            t."PAYMENT_TYPE",
+            {desc("dim_payment_type", "pt")} AS "PAYMENT_TYPE_DESC",
+            t."TRIP_TYPE",
+            {desc("dim_trip_type", "tt")} AS "TRIP_TYPE_DESC",
 
-            "VENDORID",
-            "VENDORID_DESC",
-            "PASSENGER_COUNT",
-            "TRIP_DISTANCE",
-            "RATECODEID",
-            "RATECODE_DESC",
-            "STORE_AND_FWD_FLAG_DESC",
+            -- viaje
+            t."PASSENGER_COUNT",
+            t."TRIP_DISTANCE",
+            CASE t."STORE_AND_FWD_FLAG" WHEN true THEN 'Yes' WHEN false THEN 'No' ELSE 'Unknown' END
+                AS "STORE_AND_FWD_FLAG",
 
-            -- Información de ubicación
-            "PULOCATIONID",
-            "PICKUP_ZONE",
-            "PICKUP_BOROUGH",
-            "PICKUP_SERVICE_ZONE",
-            
-            "DOLOCATIONID", 
-            "DROPOFF_ZONE",
-            "DROPOFF_BOROUGH",
-            "DROPOFF_SERVICE_ZONE",
-            
-            -- Información de pago
-            "PAYMENT_TYPE",
-            "PAYMENT_TYPE_DESC",
-            "FARE_AMOUNT",
-            "TIP_AMOUNT",
-            "EXTRA",
-            "MTA_TAX",
-            "TOLLS_AMOUNT",
-            "IMPROVEMENT_SURCHARGE",
-            "CONGESTION_SURCHARGE",
-            "CBD_CONGESTION_FEE",
-            "EHAIL_FEE",
-            "TOTAL_AMOUNT",
-            "AIRPORT_FEE",
-            
-            -- Campos específicos
-            "TRIP_TYPE",
-            "TRIP_TYPE_DESC"
-        from enriched_with_zones
-    )
-    SELECT
-        -- tiempo
-        "PICKUP_DATETIME",
-        "DROPOFF_DATETIME",
-        CAST("PICKUP_DATETIME" AS date) AS "PICKUP_DATE",
-        EXTRACT(HOUR FROM "PICKUP_DATETIME") AS "PICKUP_HOUR",
-        CAST("DROPOFF_DATETIME" AS date) AS "DROPOFF_DATE",
-        EXTRACT(HOUR FROM "DROPOFF_DATETIME") AS "DROPOFF_HOUR",
-        EXTRACT(DOW FROM "PICKUP_DATETIME") AS "DAY_OF_WEEK",
-        EXTRACT(MONTH FROM "PICKUP_DATETIME") AS "MONTH",
-        EXTRACT(YEAR FROM "PICKUP_DATETIME") AS "YEAR",
+            -- tarifas
+            t."FARE_AMOUNT",
+            t."EXTRA",
+            t."MTA_TAX",
+            t."TIP_AMOUNT",
+            t."TOLLS_AMOUNT",
+            t."IMPROVEMENT_SURCHARGE",
+            t."CONGESTION_SURCHARGE",
+            t."AIRPORT_FEE",
+            t."TOTAL_AMOUNT",
 
-        -- ubicacion
-        "PULOCATIONID" AS "PU_LOCATION_ID",
-        "PICKUP_ZONE" AS "PU_ZONE",
-        "PICKUP_BOROUGH" AS "PU_BOROUGH",
-        "DOLOCATIONID" AS "DO_LOCATION_ID",
-        "DROPOFF_ZONE" AS "DO_ZONE",
-        "DROPOFF_BOROUGH" AS "DO_BOROUGH",
+            -- derivadas
+            t."TRIP_DURATION_MIN",
+            t."AVG_SPEED_MPH",
+            t."TIP_PCT",
 
-        -- servicios y codigos
-        "SERVICE_TYPE",
-        "VENDORID" AS "VENDOR_ID",
-        "VENDORID_DESC" AS "VENDOR_NAME",
-        "RATECODEID" AS "RATE_CODE_ID",
-        "RATECODE_DESC" AS "RATE_CODE_DESC",
-        "PAYMENT_TYPE",
-        "PAYMENT_TYPE_DESC",
-        "TRIP_TYPE",
-        "TRIP_TYPE_DESC",
+            -- lineage
+            t."RUN_ID",
+            t."INGESTED_AT_UTC",
+            t."SOURCE_SERVICE",
+            t."SOURCE_YEAR",
+            t."SOURCE_MONTH"
+        FROM {OBT_TABLE} t
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_zone pz ON pz.location_id = t."PU_LOCATION_ID"
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_zone dz ON dz.location_id = t."DO_LOCATION_ID"
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_vendor v ON v.vendor_id = t."VENDOR_ID"
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_rate_code rc ON rc.rate_code_id = t."RATE_CODE_ID"
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_payment_type pt ON pt.payment_type = t."PAYMENT_TYPE"
+        LEFT JOIN {PG_SCHEMA_ANALYTICS}.dim_trip_type tt ON tt.trip_type = t."TRIP_TYPE";
+    """)
 
-        -- viaje
-        "PASSENGER_COUNT",
-        "TRIP_DISTANCE",
-        "STORE_AND_FWD_FLAG_DESC" AS "STORE_AND_FWD_FLAG",
 
-        -- tarifas
-        "FARE_AMOUNT",
-        "EXTRA",
-        "MTA_TAX",
-        "TIP_AMOUNT",
-        "TOLLS_AMOUNT",
-        "IMPROVEMENT_SURCHARGE",
-        "CONGESTION_SURCHARGE",
-        "AIRPORT_FEE",
-        "TOTAL_AMOUNT",
+# ---------------------------------------------------------------------------
+# Estado del build (checkpoints)
+# ---------------------------------------------------------------------------
 
-        -- derivadas
-        "TRIP_DURATION_MINUTES" AS "TRIP_DURATION_MIN",
-        CASE 
-            WHEN "TRIP_DURATION_MINUTES" > 0 
-            THEN ("TRIP_DISTANCE" / ("TRIP_DURATION_MINUTES" / 60)) 
-            ELSE NULL 
-        END AS "AVG_SPEED_MPH",
-        CASE 
-            WHEN "TOTAL_AMOUNT" > 0 
-            THEN ("TIP_AMOUNT" / "TOTAL_AMOUNT") * 100 
-            ELSE NULL 
-        END AS "TIP_PCT",
+def create_state_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+            run_id      text PRIMARY KEY,
+            mode        text NOT NULL,
+            year_start  integer NOT NULL,
+            year_end    integer NOT NULL,
+            services    text[] NOT NULL,
+            overwrite   boolean NOT NULL,
+            status      text NOT NULL,
+            started_at  timestamptz NOT NULL DEFAULT now(),
+            finished_at timestamptz,
+            error       text
+        );
 
-        -- lineage
-        "RUN_ID",
-        "INGESTED_AT_UTC",
-        "SERVICE_TYPE" AS "SOURCE_SERVICE",
-        "SOURCE_YEAR",
-        "SOURCE_MONTH"
-    FROM final;
+        CREATE TABLE IF NOT EXISTS {STEPS_TABLE} (
+            run_id      text NOT NULL REFERENCES {RUNS_TABLE} (run_id),
+            service     text NOT NULL,
+            year        integer NOT NULL,
+            month       integer NOT NULL,
+            status      text NOT NULL,
+            row_count   bigint,
+            finished_at timestamptz,
+            error       text,
+            PRIMARY KEY (run_id, service, year, month)
+        );
+
+        ALTER TABLE {RUNS_TABLE}
+            ADD COLUMN IF NOT EXISTS compact_schema boolean NOT NULL DEFAULT false,
+            ADD COLUMN IF NOT EXISTS engine text NOT NULL DEFAULT 'postgres',
+            ADD COLUMN IF NOT EXISTS layout jsonb;
+    """)
+
+
+def load_run(cur, run_id):
+    cur.execute(f"""
+        SELECT mode, year_start, year_end, services, overwrite, compact_schema, engine, layout, status
+        FROM {RUNS_TABLE} WHERE run_id = %s
+    """, (run_id,))
+    return cur.fetchone()
+
+
+def reset_steps(cur, run_id):
+    cur.execute(f"DELETE FROM {STEPS_TABLE} WHERE run_id = %s", (run_id,))
+
+
+def register_run(cur, args, layout=None):
+    # un run_id repetido sin --resume vuelve a empezar desde cero.
+    # layout (motor duckdb) se guarda para recrear la tabla igual al reanudar
+    reset_steps(cur, args.run_id)
+    cur.execute(f"DELETE FROM {RUNS_TABLE} WHERE run_id = %s", (args.run_id,))
+    cur.execute(f"""
+        INSERT INTO {RUNS_TABLE}
+            (run_id, mode, year_start, year_end, services, overwrite, compact_schema, engine, layout, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, 'running')
+    """, (args.run_id, args.mode, args.year_start, args.year_end, args.services, args.overwrite,
+          args.compact_schema, args.engine, json.dumps(layout, default=str) if layout else None))
+
+
+def set_run_status(cur, run_id, status, error=None):
+    cur.execute(f"""
+        UPDATE {RUNS_TABLE}
+        SET status = %s,
+            finished_at = CASE WHEN %s = 'running' THEN NULL ELSE now() END,
+            error = %s
+        WHERE run_id = %s
+    """, (status, status, error, run_id))
+
+
+def completed_steps(cur, run_id):
+    cur.execute(f"""
+        SELECT service, year, month FROM {STEPS_TABLE}
+        WHERE run_id = %s AND status = 'done'
+    """, (run_id,))
+    return {tuple(row) for row in cur.fetchall()}
+
+
+def step_row_count(cur, run_id, step):
+    # filas del paso si ya quedó confirmado, None si no
+    service, year, month = step
+    cur.execute(f"""
+        SELECT row_count FROM {STEPS_TABLE}
+        WHERE run_id = %s AND service = %s AND year = %s AND month = %s AND status = 'done'
+    """, (run_id, service, year, month))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def record_step(cur, run_id, step, status, row_count=None, error=None):
+    service, year, month = step
+    cur.execute(f"""
+        INSERT INTO {STEPS_TABLE} (run_id, service, year, month, status, row_count, finished_at, error)
+        VALUES (%s, %s, %s, %s, %s, %s, now(), %s)
+        ON CONFLICT (run_id, service, year, month) DO UPDATE
+        SET status = EXCLUDED.status,
+            row_count = EXCLUDED.row_count,
+            finished_at = EXCLUDED.finished_at,
+            error = EXCLUDED.error
+    """, (run_id, service, year, month, status, row_count, error))
+
+
+# ---------------------------------------------------------------------------
+# Construcción de la OBT
+# ---------------------------------------------------------------------------
+
+def create_raw_indexes(cur, services):
+    # cada paso filtra raw por año y mes; solo existen las tablas ingestadas
+    for service in services:
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS {service}_trips_source_idx
+            ON {PG_SCHEMA_RAW}.{service}_trips ("SOURCE_YEAR", "SOURCE_MONTH");
+        """)
+
+
+def create_partition_index(cur, table):
+    # índice para reemplazar particiones sin recorrer toda la tabla
+    name = table.split(".")[-1]
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {name}_partition_idx
+        ON {table} ("SOURCE_SERVICE", "SOURCE_YEAR", "SOURCE_MONTH");
+    """)
+
+
+def create_obt_table(cur, table, shadow, compact, services, layout=None):
+    # layout = (columnas, zonas) cuando la OBT viene del motor duckdb y raw no se usa
+    columns, zones = layout or (None, None)
+    if columns is None:
+        create_raw_indexes(cur, services)
+    if compact:
+        create_dimensions(cur, zones)
+    if shadow:
+        # tabla nueva y vacía; los índices se crean al final de la carga
+        cur.execute(f"DROP TABLE IF EXISTS {table};")
+    created = not table_exists(cur, table)
+    # solo la estructura; los datos se cargan por partición
+    if columns is None:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} AS {obt_select(services[0], compact)} WITH NO DATA;",
+            (YEAR_MIN, 1),
+        )
+    else:
+        definition = ",\n".join(f'    "{name}" {pg_type}' for name, pg_type in columns)
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table} (\n{definition}\n);")
+    if not shadow:
+        create_partition_index(cur, table)
+        # la tabla existente ya tiene este layout (ver table_layout); la vista
+        # solo se recrea si la tabla es nueva o si falta
+        if created or (compact and not table_exists(cur, VIEW)):
+            publish_view(cur, compact)
+
+
+def table_layout(cur, table):
+    """None si la tabla no existe; True si tiene el esquema compacto, False si el ancho."""
+    if not table_exists(cur, table):
+        return None
+    schema, name = table.split(".")
+    # las descripciones (PU_ZONE, etc.) solo están en la OBT ancha
+    cur.execute("""
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND column_name = 'PU_ZONE'
+    """, (schema, name))
+    return cur.fetchone()[0] == 0
+
+
+def build_step(cur, run_id, step, table, replace, compact):
+    # reemplaza la partición y marca el paso en la misma transacción,
+    # así un paso queda completo o no queda
+    service, year, month = step
+    # si se reintenta tras un commit cuyo ack se perdió, el paso ya está hecho;
+    # en la shadow no hay DELETE previo que evite duplicar la partición
+    done = step_row_count(cur, run_id, step)
+    if done is not None:
+        return done
+    if replace:
+        cur.execute(f"""
+            DELETE FROM {table}
+            WHERE "SOURCE_SERVICE" = %s AND "SOURCE_YEAR" = %s AND "SOURCE_MONTH" = %s
+        """, (service, year, month))
+    cur.execute(f"INSERT INTO {table} {obt_select(service, compact)};", (year, month))
+    row_count = cur.rowcount
+    record_step(cur, run_id, step, "done", row_count)
+    return row_count
+
+
+# ---------------------------------------------------------------------------
+# Shadow table y swap
+# ---------------------------------------------------------------------------
+
+def table_exists(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cur.fetchone()[0]
+
+
+def claim_shadow(cur, run_id):
+    # todos los runs comparten la shadow; el comentario dice de qué run son sus datos
+    cur.execute(f"COMMENT ON TABLE {SHADOW_TABLE} IS %s", (run_id,))
+
+
+def shadow_owner(cur):
+    cur.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", (SHADOW_TABLE,))
+    return cur.fetchone()[0]
+
+
+def finalize_shadow(cur):
+    # índices y estadísticas se arman en la shadow, sin tocar la OBT publicada
+    create_partition_index(cur, SHADOW_TABLE)
+    cur.execute(f"ANALYZE {SHADOW_TABLE};")
+
+
+def swap_shadow(cur, run_id, lock_timeout, compact):
+    """
+    Publica la shadow como obt_trips con renames en una sola transacción.
+    Solo toma un lock breve de metadatos; si no lo consigue dentro de
+    lock_timeout falla y RetryingConnection lo reintenta.
+    """
+    if not table_exists(cur, SHADOW_TABLE):
+        # el swap ya se hizo en un intento anterior
+        set_run_status(cur, run_id, "done")
+        return None
+
+    cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+    previous = None
+    if table_exists(cur, OBT_TABLE):
+        previous = f"{OBT_TABLE_NAME}_prev_{datetime.now():%Y%m%d%H%M%S}"
+        cur.execute(f"ALTER TABLE {OBT_TABLE} RENAME TO {previous};")
+        cur.execute(f"""
+            ALTER INDEX IF EXISTS {PG_SCHEMA_ANALYTICS}.{OBT_TABLE_NAME}_partition_idx
+            RENAME TO {previous}_partition_idx;
+        """)
+    cur.execute(f"ALTER TABLE {SHADOW_TABLE} RENAME TO {OBT_TABLE_NAME};")
+    cur.execute(f"""
+        ALTER INDEX {PG_SCHEMA_ANALYTICS}.{SHADOW_TABLE_NAME}_partition_idx
+        RENAME TO {OBT_TABLE_NAME}_partition_idx;
+    """)
+    # la vista seguía apuntando a la tabla anterior
+    publish_view(cur, compact)
+    set_run_status(cur, run_id, "done")
+    return previous
+
+
+def drop_old_generations(cur, keep):
+    # las generaciones previas se llaman obt_trips_prev_<timestamp>
+    cur.execute("""
+        SELECT tablename FROM pg_tables
+        WHERE schemaname = %s AND tablename LIKE %s
+        ORDER BY tablename DESC
+    """, (PG_SCHEMA_ANALYTICS, OBT_TABLE_NAME + r"\_prev\_%"))
+    old = [row[0] for row in cur.fetchall()][keep:]
+    for name in old:
+        cur.execute(f"DROP TABLE IF EXISTS {PG_SCHEMA_ANALYTICS}.{name};")
+    return old
+
+
+# ---------------------------------------------------------------------------
+# Motor DuckDB
+# ---------------------------------------------------------------------------
+
+# columnas que no existen en todos los años de los parquet de TLC
+DUCKDB_OPTIONAL_COLUMNS = [
+    "CONGESTION_SURCHARGE", "AIRPORT_FEE", "CBD_CONGESTION_FEE", "EHAIL_FEE", "TRIP_TYPE",
+]
+
+DUCKDB_TO_POSTGRES_TYPES = {
+    "BOOLEAN": "boolean",
+    "SMALLINT": "smallint",
+    "INTEGER": "integer",
+    "BIGINT": "bigint",
+    "FLOAT": "real",
+    "DOUBLE": "double precision",
+    "DATE": "date",
+    "TIMESTAMP": "timestamp",
+    "TIMESTAMP_NS": "timestamp",
+    "TIMESTAMP WITH TIME ZONE": "timestamptz",
+    "VARCHAR": "text",
+}
+
+
+def postgres_type(duckdb_type):
+    if duckdb_type.startswith("DECIMAL"):
+        return "numeric"
+    return DUCKDB_TO_POSTGRES_TYPES.get(duckdb_type, "text")
+
+
+def raw_parquet_files(data_dir, service, year_start, year_end):
+    # mismos nombres de archivo que publica TLC (ver 01_ingesta_parquet_raw)
+    paths = [
+        os.path.join(data_dir, f"{service}_tripdata_{year}-{month:02d}.parquet")
+        for year in range(year_start, year_end + 1)
+        for month in MONTHS
+    ]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def sql_list(paths):
+    return "[" + ", ".join("'" + path.replace("'", "''") + "'" for path in paths) + "]"
+
+
+def register_duckdb_raw(duck, service, files):
+    """
+    Crea la vista raw_<service> sobre los parquet con las mismas columnas
+    de metadatos que agrega la ingesta a raw.<service>_trips.
+    """
+    source = f"read_parquet({sql_list(files)}, union_by_name = true, filename = true)"
+    # TLC publica nombres en minúscula o camel case (passenger_count, VendorID);
+    # se pasan a mayúsculas como en raw.<service>_trips, que usa source_cte
+    names = [row[0] for row in duck.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+             if row[0] != "filename"]
+    upper = ",\n                ".join(
+        '"{}" AS "{}"'.format(name.replace('"', '""'), name.upper()) for name in names
+    )
+    present = {name.upper() for name in names}
+    missing = ", ".join(
+        f'NULL::double AS "{column}"' for column in DUCKDB_OPTIONAL_COLUMNS if column not in present
+    )
+    duck.execute(f"""
+        CREATE OR REPLACE TEMP VIEW raw_{service} AS
+        WITH files AS (
+            SELECT
+                {upper},
+                filename,
+                CAST(regexp_extract(filename, '(\\d{{4}})-(\\d{{2}})\\.parquet$', 1) AS INTEGER) AS "SOURCE_YEAR",
+                CAST(regexp_extract(filename, '(\\d{{4}})-(\\d{{2}})\\.parquet$', 2) AS INTEGER) AS "SOURCE_MONTH"
+            FROM {source}
+        )
+        SELECT
+            *,
+            {missing + "," if missing else ""}
+            'run_' || "SOURCE_YEAR" || '_' || lpad(CAST("SOURCE_MONTH" AS VARCHAR), 2, '0') AS "RUN_ID",
+            '{service}' AS "SERVICE_TYPE",
+            timezone('UTC', now()) AS "INGESTED_AT_UTC",
+            filename AS "SOURCE_PATH"
+        FROM files
+    """)
+
+
+def parquet_partition_path(output_dir, step):
+    service, year, month = step
+    return os.path.join(
+        output_dir, f"SOURCE_SERVICE={service}", f"SOURCE_YEAR={year}", f"SOURCE_MONTH={month}"
+    )
+
+
+def build_parquet_with_duckdb(args):
+    """
+    Construye la OBT directo desde los parquet locales con DuckDB y la
+    escribe como parquet particionado por servicio, año y mes.
+    Devuelve las columnas (nombre, tipo postgres) y las zonas leídas, para
+    crear las tablas en Postgres sin pasar por raw.
     """
+    import duckdb
+
+    duck = duckdb.connect()
+    if args.threads:
+        duck.execute(f"SET threads = {int(args.threads)};")
+    # no hace falta mantener el orden de inserción; baja el uso de memoria
+    duck.execute("SET preserve_insertion_order = false;")
+    duck.execute(f"""
+        CREATE TEMP VIEW taxi_zones AS
+        SELECT * FROM read_csv_auto('{args.zones_path.replace("'", "''")}', header = true);
+    """)
+
+    selects = []
+    for service in args.services:
+        files = raw_parquet_files(args.data_dir, service, args.year_start, args.year_end)
+        if not files:
+            print(f"No hay parquet de {service} en {args.data_dir}; se omite")
+            continue
+        print(f"{service}: {len(files)} archivos parquet")
+        register_duckdb_raw(duck, service, files)
+        select = obt_select(service, args.compact_schema, relation=f"raw_{service}", zones="taxi_zones")
+        selects.append(f"SELECT * FROM ({select}) AS {service}_obt")
+    if not selects:
+        sys.exit(f"No se encontraron parquet en {args.data_dir}")
+
+    # se reemplazan solo los años del rango pedido
+    for service in args.services:
+        for year in range(args.year_start, args.year_end + 1):
+            shutil.rmtree(os.path.join(args.output_dir, f"SOURCE_SERVICE={service}", f"SOURCE_YEAR={year}"),
+                          ignore_errors=True)
+
+    union = " UNION ALL ".join(selects)
+    columns = [(row[0], postgres_type(row[1])) for row in duck.execute(f"DESCRIBE {union}").fetchall()]
+    zones = duck.execute(
+        'SELECT "LocationID", "Zone", "Borough", "service_zone" FROM taxi_zones'
+    ).fetchall()
+
+    start_time = time.time()
+    duck.execute(f"""
+        COPY ({union})
+        TO '{args.output_dir.replace("'", "''")}'
+        (FORMAT PARQUET, PARTITION_BY ("SOURCE_SERVICE", "SOURCE_YEAR", "SOURCE_MONTH"), OVERWRITE_OR_IGNORE true);
+    """)
+    print(f"OBT parquet escrita en {args.output_dir} en {time.time() - start_time:.1f}s")
+    duck.close()
+    return columns, zones
+
+
+def load_parquet_step(cur, run_id, step, table, replace, duck, output_dir):
+    # misma semántica que build_step, pero la partición sale del parquet de DuckDB
+    service, year, month = step
+    done = step_row_count(cur, run_id, step)
+    if done is not None:
+        return done
+    if replace:
+        cur.execute(f"""
+            DELETE FROM {table}
+            WHERE "SOURCE_SERVICE" = %s AND "SOURCE_YEAR" = %s AND "SOURCE_MONTH" = %s
+        """, (service, year, month))
+
+    row_count = 0
+    path = parquet_partition_path(output_dir, step)
+    if os.path.isdir(path):
+        schema, name = table.split(".")
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s
+            ORDER BY ordinal_position
+        """, (schema, name))
+        columns = ", ".join(f'"{column}"' for (column,) in cur.fetchall())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, "partition.csv")
+            duck.execute(f"""
+                COPY (
+                    SELECT {columns}
+                    FROM read_parquet('{os.path.join(path, "*.parquet")}', hive_partitioning = true)
+                ) TO '{csv_path}' (FORMAT CSV, HEADER false);
+            """)
+            with open(csv_path) as f:
+                cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", f)
+            row_count = cur.rowcount
+
+    record_step(cur, run_id, step, "done", row_count)
+    return row_count
+
+
+def plan_steps(args):
+    return [
+        (service, year, month)
+        for year in range(args.year_start, args.year_end + 1)
+        for month in MONTHS
+        for service in args.services
+    ]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build analytics.obt_trips table")
+    parser.add_argument("--mode", choices=["full", "by-partition"], default="full")
+    parser.add_argument("--year-start", type=int)
+    parser.add_argument("--year-end", type=int)
+    parser.add_argument("--services", nargs="+", choices=SERVICES)
+    parser.add_argument("--run-id")
+    parser.add_argument("--overwrite", choices=["true", "false"], default="false")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="continuar un run previo desde el último paso confirmado")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--retry-base-delay", type=float, default=2.0)
+    parser.add_argument("--keep-generations", type=int, default=0,
+                        help="cantidad de versiones previas de obt_trips a conservar tras el swap")
+    parser.add_argument("--swap-lock-timeout", default="500ms",
+                        help="lock_timeout de cada intento del swap de la shadow table")
+    parser.add_argument("--compact-schema", action="store_true",
+                        help="tipos angostos y solo códigos en obt_trips; descripciones en obt_trips_view")
+    parser.add_argument("--engine", choices=["postgres", "duckdb"], default="postgres",
+                        help="duckdb construye la OBT directo desde los parquet locales")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "raw"),
+                        help="carpeta con los parquet mensuales de TLC (motor duckdb)")
+    parser.add_argument("--zones-path",
+                        help="taxi_zone_lookup.csv (motor duckdb); por defecto dentro de --data-dir")
+    parser.add_argument("--output-dir",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "obt_parquet"),
+                        help="salida de la OBT en parquet particionado (motor duckdb)")
+    parser.add_argument("--load-postgres", action="store_true",
+                        help="cargar la OBT parquet en analytics.obt_trips (motor duckdb)")
+    parser.add_argument("--threads", type=int, help="hilos de DuckDB (por defecto todos los núcleos)")
+    args = parser.parse_args()
+    args.zones_path = args.zones_path or os.path.join(args.data_dir, "taxi_zone_lookup.csv")
+
+    if args.resume:
+        args.run_id = args.resume
+        return args
+
+    if args.mode == "full":
+        args.overwrite = "true"
+        args.year_start = YEAR_MIN
+        args.year_end = YEAR_MAX
+        args.services = ["green", "yellow"]
+
+    missing = [name for name in ("year_start", "year_end", "services", "run_id")
+               if getattr(args, name) is None]
+    if missing:
+        parser.error("faltan argumentos: " + ", ".join("--" + m.replace("_", "-") for m in missing))
+    args.overwrite = args.overwrite == "true"
+    return args
+
+
+def run_or_fail(db, run_id, action, description):
+    # como un paso fallido: el run queda en failed y se puede reanudar
+    try:
+        return db.run(action, description)
+    except Exception as e:
+        print(f"Error durante {description}:", e)
+        db.run(lambda cur: set_run_status(cur, run_id, "failed", str(e)), "registro de error")
+        sys.exit(f"Run {run_id} detenido; reanudar con --resume {run_id}")
+
+
+def main():
+    args = parse_args()
+
+    layout = None
+    if args.engine == "duckdb" and not args.resume:
+        print(f"Construyendo OBT con DuckDB desde {args.data_dir}...")
+        layout = build_parquet_with_duckdb(args)
+        if not args.load_postgres:
+            return
+
+    db = RetryingConnection(max_attempts=args.max_retries, base_delay=args.retry_base_delay)
+
+    try:
+        db.run(create_state_tables, "creación de tablas de estado")
+        existing = db.run(lambda cur: load_run(cur, args.run_id), "lectura de estado")
+
+        if args.resume:
+            if existing is None:
+                sys.exit(f"No existe el run {args.run_id} para reanudar")
+            (args.mode, args.year_start, args.year_end, args.services, args.overwrite,
+             args.compact_schema, args.engine, layout, status) = existing
+            if status == "done":
+                print(f"El run {args.run_id} ya terminó. Nada que hacer.")
+                return
+            db.run(lambda cur: set_run_status(cur, args.run_id, "running"), "reanudar run")
+            print(f"Reanudando run {args.run_id}...")
+        elif existing is not None:
+            print(f"El run {args.run_id} ya existe; se reinicia (usar --resume para continuarlo)")
+
+        # con overwrite se construye en una shadow table y se publica al final;
+        # obt_trips sigue disponible para lectura durante todo el build
+        shadow = args.overwrite
+        compact = args.compact_schema
+        table = SHADOW_TABLE if shadow else OBT_TABLE
+
+        if not shadow:
+            # by-partition escribe sobre la OBT publicada: el layout tiene que coincidir,
+            # y se valida antes de cualquier DDL
+            current = db.run(lambda cur: table_layout(cur, OBT_TABLE), "lectura de OBT")
+            if current is not None and current != compact:
+                built = "con" if current else "sin"
+                error = (f"{OBT_TABLE} fue construida {built} --compact-schema; usar el mismo flag "
+                         f"o reconstruirla con --overwrite true")
+                if args.resume:
+                    db.run(lambda cur: set_run_status(cur, args.run_id, "failed", error), "registro de error")
+                sys.exit(error)
+
+        if not args.resume:
+            # registro y tabla en la misma transacción: no queda un run sin su tabla
+            def register_and_create(cur):
+                register_run(cur, args, layout)
+                create_obt_table(cur, table, shadow, compact, args.services, layout)
+                if shadow:
+                    claim_shadow(cur, args.run_id)
+
+            try:
+                db.run(register_and_create, "registro del run y creación de OBT")
+            except Exception as e:
+                sys.exit(f"No se pudo crear {table}: {e}")
+        else:
+            def check_table(cur):
+                if not table_exists(cur, table):
+                    return f"{table} no existe"
+                owner = shadow_owner(cur) if shadow else args.run_id
+                if owner != args.run_id:
+                    # otro run recreó la shadow: los pasos confirmados de este ya no están en ella
+                    return f"{table} tiene datos del run {owner}"
+                return None
+
+            problem = db.run(check_table, "lectura de OBT")
+            if problem:
+                print(f"{problem}; se vuelve a crear y se rehacen todos los pasos")
+
+                def recreate(cur):
+                    reset_steps(cur, args.run_id)
+                    create_obt_table(cur, table, shadow, compact, args.services, layout)
+                    if shadow:
+                        claim_shadow(cur, args.run_id)
+
+                run_or_fail(db, args.run_id, recreate, "creación de OBT")
+
+        if args.engine == "duckdb":
+            import duckdb
+
+            duck = duckdb.connect()
+            print(f"Cargando OBT parquet desde {args.output_dir}...")
+
+            def step_action(cur, step):
+                return load_parquet_step(cur, args.run_id, step, table, not shadow, duck, args.output_dir)
+        else:
+            def step_action(cur, step):
+                return build_step(cur, args.run_id, step, table, not shadow, compact)
 
-print(f"Ejecutando creación de OBT_TRIPS ({args.mode})...")
-print(f"Años: {args.year_start}–{args.year_end}, Servicios: {args.services}, RunID: {args.run_id}")
+        print(f"Ejecutando creación de OBT_TRIPS ({args.mode})...")
+        print(f"Años: {args.year_start}–{args.year_end}, Servicios: {args.services}, RunID: {args.run_id}")
 
-try:
-    conn = get_connection()
-    cur = conn.cursor()
-    #cur.execute("CREATE SCHEMA IF NOT EXISTS " + PG_SCHEMA_ANALYTICS + ";")
-    cur.execute(query, 
-                (args.year_start, args.year_end,
-                 args.year_start, args.year_end))
-    conn.commit()
-    print("Tabla creada correctamente en schema:", PG_SCHEMA_ANALYTICS)
+        done = db.run(lambda cur: completed_steps(cur, args.run_id), "lectura de pasos")
+        steps = plan_steps(args)
+        pending = [step for step in steps if step not in done]
+        print(f"Pasos: {len(steps)} totales, {len(steps) - len(pending)} completos, {len(pending)} pendientes")
 
-except Exception as e:
-    print("Error durante la ejecución:", e)
-    conn.rollback()
+        for i, step in enumerate(pending, start=1):
+            service, year, month = step
+            description = f"{service} {year}-{month:02d}"
+            start_time = time.time()
+            try:
+                row_count = db.run(lambda cur: step_action(cur, step), description)
+            except Exception as e:
+                print(f"Error durante {description}:", e)
+                db.run(lambda cur: record_step(cur, args.run_id, step, "failed", error=str(e)),
+                       "registro de error")
+                db.run(lambda cur: set_run_status(cur, args.run_id, "failed", str(e)), "registro de error")
+                sys.exit(f"Run {args.run_id} detenido; reanudar con --resume {args.run_id}")
+            print(f"[{i}/{len(pending)}] {description}: {row_count} filas en {time.time() - start_time:.1f}s")
 
-finally:
-    cur.close()
-    conn.close()
+        if shadow:
+            if db.run(lambda cur: table_exists(cur, SHADOW_TABLE), "lectura de shadow"):
+                print(f"Creando índices y estadísticas en {SHADOW_TABLE}...")
+                run_or_fail(db, args.run_id, finalize_shadow, "índices de shadow")
+            previous = run_or_fail(
+                db, args.run_id,
+                lambda cur: swap_shadow(cur, args.run_id, args.swap_lock_timeout, compact),
+                "swap de shadow",
+            )
+            if previous:
+                print(f"{SHADOW_TABLE} publicada como {OBT_TABLE}; versión anterior: {previous}")
+            dropped = db.run(lambda cur: drop_old_generations(cur, args.keep_generations),
+                             "limpieza de versiones previas")
+            for name in dropped:
+                print(f"Eliminada versión previa: {name}")
+        else:
+            db.run(lambda cur: set_run_status(cur, args.run_id, "done"), "cierre del run")
+        print("Tabla creada correctamente en schema:", PG_SCHEMA_ANALYTICS)
 
+    finally:
+        db.close()
 
 
+if __name__ == "__main__":
+    main()
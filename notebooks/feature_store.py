@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "features")
+
+
+def dataframe_version(df):
+    """Hash del contenido del DataFrame; cambia si cambian los datos de origen."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(",".join(map(str, df.columns)).encode())
+    return digest.hexdigest()[:16]
+
+
+def file_version(path):
+    """
+    Versión barata de un archivo de datos (ruta, tamaño y fecha de
+    modificación): no hace falta leerlo para saber si hay features guardadas.
+    """
+    stat = os.stat(path)
+    payload = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def estimator_config(estimator):
+    """
+    Parámetros completos (get_params) de un transformer de sklearn, o de un
+    dict de ellos, para usarlos como configuración en la clave.
+    """
+    if isinstance(estimator, dict):
+        return {name: estimator_config(value) for name, value in estimator.items()}
+    params = estimator.get_params(deep=True)
+    return {
+        "class": f"{type(estimator).__module__}.{type(estimator).__name__}",
+        "params": {name: repr(value) for name, value in sorted(params.items())},
+    }
+
+
+def config_key(data_version, config):
+    payload = json.dumps({"data_version": data_version, "config": config}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class FeatureSet:
+    """Matrices codificadas por split (memory-mapped) y el transformer ajustado."""
+
+    def __init__(self, path, arrays, transformer, meta):
+        self.path = path
+        self.arrays = arrays
+        self.transformer = transformer
+        self.meta = meta
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def split(self, name):
+        return self.arrays[f"X_{name}"], self.arrays[f"y_{name}"]
+
+
+class FeatureStore:
+    """
+    Guarda en disco las matrices X/y de train, val y test junto al
+    transformer ajustado, en una carpeta por (nombre, versión de datos, config).
+    Los arrays se leen con np.load(mmap_mode="r"): no se copian a memoria y
+    varios procesos comparten las mismas páginas del page cache.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def path_for(self, name, data_version, config):
+        return os.path.join(self.root, name, config_key(data_version, config))
+
+    def exists(self, name, data_version, config):
+        return os.path.exists(os.path.join(self.path_for(name, data_version, config), "meta.json"))
+
+    def save(self, name, data_version, config, arrays, transformer=None):
+        path = self.path_for(name, data_version, config)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # se escribe en una carpeta temporal y se renombra al final,
+        # así un proceso nunca ve una versión a medio escribir
+        tmp_path = tempfile.mkdtemp(prefix=".tmp_", dir=os.path.dirname(path))
+        try:
+            shapes = {}
+            for array_name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                np.save(os.path.join(tmp_path, f"{array_name}.npy"), array)
+                shapes[array_name] = {"shape": list(array.shape), "dtype": str(array.dtype)}
+            if transformer is not None:
+                with open(os.path.join(tmp_path, "transformer.pkl"), "wb") as f:
+                    pickle.dump(transformer, f)
+            meta = {
+                "name": name,
+                "data_version": data_version,
+                "config": config,
+                "arrays": shapes,
+                "created_at": datetime.now().isoformat(),
+            }
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2, default=str)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.rename(tmp_path, path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return self.load(name, data_version, config)
+
+    def load(self, name, data_version, config):
+        path = self.path_for(name, data_version, config)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            array_name: np.load(os.path.join(path, f"{array_name}.npy"), mmap_mode="r")
+            for array_name in meta["arrays"]
+        }
+        transformer = None
+        transformer_path = os.path.join(path, "transformer.pkl")
+        if os.path.exists(transformer_path):
+            with open(transformer_path, "rb") as f:
+                transformer = pickle.load(f)
+        return FeatureSet(path, arrays, transformer, meta)
+
+    def get_or_build(self, name, data_version, config, build):
+        """
+        Devuelve el FeatureSet guardado o lo construye con build(), que debe
+        retornar (dict de arrays, transformer ajustado).
+        """
+        if self.exists(name, data_version, config):
+            print(f"Features '{name}' cargadas desde {self.path_for(name, data_version, config)}")
+            return self.load(name, data_version, config)
+        print(f"Construyendo features '{name}'...")
+        arrays, transformer = build()
+        return self.save(name, data_version, config, arrays, transformer)
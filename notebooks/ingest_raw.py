@@ -0,0 +1,373 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PG_HOST = os.getenv("PG_HOST")
+PG_PORT = os.getenv("PG_PORT")
+PG_DB = os.getenv("PG_DB")
+PG_USER = os.getenv("PG_USER")
+PG_PASSWORD = os.getenv("PG_PASSWORD")
+PG_SCHEMA = os.getenv("PG_SCHEMA_RAW")
+
+TASKS_TABLE = f"{PG_SCHEMA}.ingest_tasks"
+
+BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
+ZONES_URL = "https://d37ci6vzurychx.cloudfront.net/misc/taxi_zone_lookup.csv"
+
+YEAR_MIN = 2015
+YEAR_MAX = 2025
+SERVICES = ["yellow", "green"]
+MONTHS = list(range(1, 13))
+
+ORDERED_COLS = {
+    "yellow": [
+        "VENDORID", "TPEP_PICKUP_DATETIME", "TPEP_DROPOFF_DATETIME",
+        "PASSENGER_COUNT", "TRIP_DISTANCE", "RATECODEID",
+        "STORE_AND_FWD_FLAG", "PULOCATIONID", "DOLOCATIONID",
+        "PAYMENT_TYPE", "FARE_AMOUNT", "EXTRA", "MTA_TAX",
+        "TIP_AMOUNT", "TOLLS_AMOUNT", "IMPROVEMENT_SURCHARGE",
+        "TOTAL_AMOUNT", "CONGESTION_SURCHARGE", "AIRPORT_FEE",
+        "CBD_CONGESTION_FEE",
+        "RUN_ID", "SERVICE_TYPE", "SOURCE_YEAR", "SOURCE_MONTH",
+        "INGESTED_AT_UTC", "SOURCE_PATH"
+    ],
+    "green": [
+        "VENDORID", "LPEP_PICKUP_DATETIME", "LPEP_DROPOFF_DATETIME",
+        "STORE_AND_FWD_FLAG", "RATECODEID",
+        "PULOCATIONID", "DOLOCATIONID", "PASSENGER_COUNT", "TRIP_DISTANCE",
+        "FARE_AMOUNT", "EXTRA", "MTA_TAX", "TIP_AMOUNT", "TOLLS_AMOUNT",
+        "EHAIL_FEE", "IMPROVEMENT_SURCHARGE", "TOTAL_AMOUNT",
+        "PAYMENT_TYPE", "TRIP_TYPE", "CONGESTION_SURCHARGE",
+        "CBD_CONGESTION_FEE",
+        "RUN_ID", "SERVICE_TYPE", "SOURCE_YEAR", "SOURCE_MONTH",
+        "INGESTED_AT_UTC", "SOURCE_PATH"
+    ],
+}
+# errores de conexión que vale la pena reintentar en execute()
+RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+EXECUTE_ATTEMPTS = 3
+
+TIMESTAMP_COLS = {
+    "yellow": ["TPEP_PICKUP_DATETIME", "TPEP_DROPOFF_DATETIME"],
+    "green": ["LPEP_PICKUP_DATETIME", "LPEP_DROPOFF_DATETIME"],
+}
+
+
+def get_connection():
+    return psycopg2.connect(
+        host=PG_HOST,
+        port=PG_PORT,
+        dbname=PG_DB,
+        user=PG_USER,
+        password=PG_PASSWORD
+    )
+
+
+def pg_options():
+    return {
+        "url": f"jdbc:postgresql://{os.getenv('PG_HOST', 'postgres-warehouse')}:{os.getenv('PG_PORT', '5432')}/{os.getenv('PG_DB', 'warehouse_db')}",
+        "user": os.getenv("PG_USER", "postgres"),
+        "password": os.getenv("PG_PASSWORD", "postgres"),
+        "driver": "org.postgresql.Driver"
+    }
+
+
+def execute(query, params=None, fetch=False):
+    # conexión corta por llamada: cada worker usa la suya. Todas las
+    # sentencias son idempotentes, así que un corte se reintenta aquí mismo
+    for attempt in range(1, EXECUTE_ATTEMPTS + 1):
+        try:
+            conn = get_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall() if fetch else None
+                conn.commit()
+                return rows
+            finally:
+                conn.close()
+        except RETRYABLE_ERRORS:
+            if attempt == EXECUTE_ATTEMPTS:
+                raise
+            time.sleep(2 ** (attempt - 1))
+
+
+# ---------------------------------------------------------------------------
+# Estado de las tareas
+# ---------------------------------------------------------------------------
+
+def create_tasks_table():
+    execute(f"""
+        CREATE SCHEMA IF NOT EXISTS {PG_SCHEMA};
+
+        CREATE TABLE IF NOT EXISTS {TASKS_TABLE} (
+            service    text NOT NULL,
+            year       integer NOT NULL,
+            month      integer NOT NULL,
+            status     text NOT NULL,
+            attempts   integer NOT NULL DEFAULT 0,
+            row_count  bigint,
+            error      text,
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (service, year, month)
+        );
+    """)
+
+
+def task_states():
+    rows = execute(f"SELECT service, year, month, status FROM {TASKS_TABLE}", fetch=True)
+    return {(service, year, month): status for service, year, month, status in rows}
+
+
+def set_task_status(task, status, row_count=None, error=None, new_attempt=False):
+    service, year, month = task
+    execute(f"""
+        INSERT INTO {TASKS_TABLE} (service, year, month, status, attempts, row_count, error)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (service, year, month) DO UPDATE
+        SET status = EXCLUDED.status,
+            attempts = {TASKS_TABLE}.attempts + EXCLUDED.attempts,
+            row_count = EXCLUDED.row_count,
+            error = EXCLUDED.error,
+            updated_at = now()
+    """, (service, year, month, status, int(new_attempt), row_count, error))
+
+
+def table_exists(table):
+    return execute("SELECT to_regclass(%s) IS NOT NULL", (table,), fetch=True)[0][0]
+
+
+def create_source_index(service):
+    # mismo índice que crea build_obt.py; hace barato el DELETE de cada mes
+    execute(f"""
+        CREATE INDEX IF NOT EXISTS {service}_trips_source_idx
+        ON {PG_SCHEMA}.{service}_trips ("SOURCE_YEAR", "SOURCE_MONTH");
+    """)
+
+
+# ---------------------------------------------------------------------------
+# Ingesta de una partición (service, year, month)
+# ---------------------------------------------------------------------------
+
+def download(url, suffix):
+    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        with requests.get(url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=8 * 1024 * 1024):
+                tmp_file.write(chunk)
+    except Exception:
+        tmp_file.close()
+        os.remove(tmp_file.name)
+        raise
+    tmp_file.close()
+    return tmp_file.name
+
+
+def ingest_partition(spark, task, table_lock):
+    """
+    Descarga y carga un mes en raw.<service>_trips, reemplazando las filas
+    que ya hubiera de ese mes (un intento anterior o el notebook).
+    Devuelve la cantidad de filas, o None si TLC aún no publica el archivo.
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql import types as T
+
+    service, year, month = task
+    url = f"{BASE_URL}/{service}_tripdata_{year}-{month:02d}.parquet"
+    table_name = f"{PG_SCHEMA}.{service}_trips"
+
+    head = requests.head(url, timeout=30)
+    # CloudFront responde 403/404 para meses no publicados; cualquier otro
+    # error (429, 5xx) se reintenta
+    if head.status_code in (403, 404):
+        return None
+    head.raise_for_status()
+
+    tmp_path = download(url, ".parquet")
+    try:
+        df = spark.read.parquet(tmp_path)
+
+        # Agregar metadatos
+        df = (
+            df.withColumn("RUN_ID", F.lit(f"run_{year}_{month:02d}"))
+            .withColumn("SERVICE_TYPE", F.lit(service))
+            .withColumn("SOURCE_YEAR", F.lit(year))
+            .withColumn("SOURCE_MONTH", F.lit(month))
+            .withColumn("INGESTED_AT_UTC", F.current_timestamp())
+            .withColumn("SOURCE_PATH", F.lit(url))
+        )
+
+        # Normalizar columnas
+        df = df.toDF(*[c.upper() for c in df.columns])
+
+        # Asegurar columnas timestamp
+        for col_name in TIMESTAMP_COLS[service]:
+            if col_name in df.columns:
+                df = df.withColumn(col_name, F.col(col_name).cast("timestamp"))
+
+        # Columna nueva si no existe
+        if "CBD_CONGESTION_FEE" not in df.columns:
+            df = df.withColumn("CBD_CONGESTION_FEE", F.lit(None).cast(T.DoubleType()))
+
+        # Reordenar columnas
+        df = df.select([c for c in ORDERED_COLS[service] if c in df.columns])
+        row_count = df.count()
+
+        # indempotencia: un intento previo pudo dejar el mes a medias
+        if table_exists(table_name):
+            execute(f"""
+                DELETE FROM {table_name}
+                WHERE "SOURCE_YEAR" = %s AND "SOURCE_MONTH" = %s
+            """, (year, month))
+
+        writer = df.write.format("jdbc").options(**pg_options()).option("dbtable", table_name).mode("append")
+        # la primera escritura crea la tabla; se serializa por servicio
+        with table_lock:
+            if not table_exists(table_name):
+                writer.save()
+                create_source_index(service)
+                return row_count
+        writer.save()
+        return row_count
+    finally:
+        os.remove(tmp_path)
+
+
+def run_task(spark, task, table_lock, max_retries, retry_base_delay):
+    service, year, month = task
+    label = f"{service} {year}-{month:02d}"
+
+    for attempt in range(1, max_retries + 1):
+        # los cambios de estado van dentro del intento: si falla la escritura
+        # del estado se reintenta el mes completo (la carga es idempotente)
+        try:
+            set_task_status(task, "running", new_attempt=True)
+            row_count = ingest_partition(spark, task, table_lock)
+            if row_count is None:
+                set_task_status(task, "missing")
+                print(f"No existe: {label}")
+                return "missing"
+            set_task_status(task, "done", row_count=row_count)
+            print(f"Datos de {label} cargados en PostgreSQL ({row_count} filas)")
+            return "done"
+        except Exception as e:
+            if attempt == max_retries:
+                print(f"Error al procesar {label}: {e}. Máximo de intentos alcanzado.")
+                try:
+                    set_task_status(task, "failed", error=str(e))
+                except Exception as status_error:
+                    print(f"No se pudo registrar el error de {label}: {status_error}")
+                return "failed"
+            delay = retry_base_delay * (2 ** (attempt - 1))
+            print(f"Error al procesar {label} (intento {attempt}/{max_retries}): {e}. Reintentando en {delay:.0f}s...")
+            time.sleep(delay)
+
+
+def plan_tasks(services, year_start, year_end):
+    return [
+        (service, year, month)
+        for year in range(year_start, year_end + 1)
+        for month in MONTHS
+        for service in services
+    ]
+
+
+def ingest(spark, services=SERVICES, year_start=YEAR_MIN, year_end=YEAR_MAX, workers=4,
+           max_retries=3, retry_base_delay=10.0, force=False):
+    """
+    Ingesta los meses pedidos con un pool acotado de workers. Las tareas
+    terminadas quedan en raw.ingest_tasks y se saltan en la siguiente
+    ejecución, salvo force=True; los meses missing se vuelven a consultar.
+    """
+    create_tasks_table()
+    for service in services:
+        if table_exists(f"{PG_SCHEMA}.{service}_trips"):
+            create_source_index(service)
+    states = task_states()
+    tasks = plan_tasks(services, year_start, year_end)
+    pending = [task for task in tasks if force or states.get(task) != "done"]
+    print(f"Tareas: {len(tasks)} totales, {len(tasks) - len(pending)} completas, {len(pending)} pendientes")
+
+    table_locks = {service: threading.Lock() for service in services}
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_task, spark, task, table_locks[task[0]], max_retries, retry_base_delay): task
+            for task in pending
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            # un error inesperado en una tarea no corta las demás ni el resumen
+            try:
+                results[task] = future.result()
+            except Exception as e:
+                print(f"Error inesperado en {task[0]} {task[1]}-{task[2]:02d}: {e}")
+                results[task] = "failed"
+    return results
+
+
+def load_taxi_zones(spark):
+    tmp_path = download(ZONES_URL, ".csv")
+    try:
+        df_zones = spark.read.csv(tmp_path, header=True, inferSchema=True)
+        df_zones.write \
+            .format("jdbc") \
+            .options(**pg_options()) \
+            .option("dbtable", f"{PG_SCHEMA}.taxi_zones") \
+            .mode("overwrite") \
+            .save()
+        print("Datos de taxi zones cargados en PostgreSQL")
+    finally:
+        os.remove(tmp_path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingesta de parquet TLC a raw.*_trips")
+    parser.add_argument("--year-start", type=int, default=YEAR_MIN)
+    parser.add_argument("--year-end", type=int, default=YEAR_MAX)
+    parser.add_argument("--services", nargs="+", choices=SERVICES, default=SERVICES)
+    parser.add_argument("--workers", type=int, default=4, help="tareas (service, año, mes) en paralelo")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--retry-base-delay", type=float, default=10.0)
+    parser.add_argument("--force", action="store_true", help="reingestar también los meses ya cargados")
+    parser.add_argument("--skip-zones", action="store_true", help="no recargar taxi_zones")
+    return parser.parse_args()
+
+
+def main():
+    from pyspark.sql import SparkSession
+
+    args = parse_args()
+    spark = SparkSession.builder \
+        .appName("IngestaParquetPostgres") \
+        .config("spark.jars.packages", "org.postgresql:postgresql:42.2.18") \
+        .config("spark.scheduler.mode", "FAIR") \
+        .getOrCreate()
+
+    try:
+        if not args.skip_zones:
+            load_taxi_zones(spark)
+        results = ingest(spark, args.services, args.year_start, args.year_end, args.workers,
+                         args.max_retries, args.retry_base_delay, args.force)
+    finally:
+        spark.stop()
+
+    summary = {status: list(results.values()).count(status) for status in ("done", "missing", "failed")}
+    print(f"Resumen: {summary}")
+    if summary["failed"]:
+        sys.exit("Hay meses con error; volver a ejecutar para reintentarlos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import numpy as np
+
+
+# Stochastic Gradient Descent con numpy
+class SGDRegressorScratch:
+    def __init__(self, learning_rate=0.01, n_epochs=1000, alpha = 0.001, batch_size=2048):
+        self.learning_rate = learning_rate
+        self.n_epochs = n_epochs
+        self.alpha = alpha
+        self.batch_size = batch_size         # sklearn usa mini-batch interno
+        self.coef_ = None
+        self.intercept_ = None
+        self.costs = []
+
+    def fit(self, X, y):
+        # Asegurar arrays numpy
+        X = np.array(X).astype(float)
+        y = np.array(y).astype(float)
+        n_samples, n_features = X.shape
+
+        # Inicializar pesos
+        self.coef_ = np.zeros(n_features)
+        self.intercept_ = 0 # inicializar intercepto
+
+        # SGD
+        for epoch in range(self.n_epochs):
+            # Mezclar los datos como en sklearn
+            idx = np.random.permutation(n_samples)
+            X_shuffled = X[idx]
+            y_shuffled = y[idx]
+            # mini-batch para que sea SGD
+            for start in range(0, n_samples, self.batch_size):
+                end = start + self.batch_size
+                X_batch = X_shuffled[start:end]
+                y_batch = y_shuffled[start:end]
+
+                # Predicciones para el mini-batch
+                y_pred = np.dot(X_batch, self.coef_) + self.intercept_
+                # Calcular el error
+                error = y_pred - y_batch
+                # costo (MSE)
+                cost = np.mean(error**2)
+                self.costs.append(cost)
+                # Gradientes
+                gradient_w = (2/len(y_batch)) * np.dot(X_batch.T, error) + 2 * self.alpha * self.coef_
+                gradient_b = (2/len(y_batch)) * np.sum(error)
+                # Actualizar pesos
+                self.coef_ -= self.learning_rate * gradient_w
+                self.intercept_ -= self.learning_rate * gradient_b
+
+        return self
+
+    def predict(self, X):
+        X = np.array(X).astype(float)
+        return np.dot(X, self.coef_) + self.intercept_
+
+    # R², RMSE, MAE
+    def score(self, X, y):
+        X = np.array(X).astype(float)
+        y = np.array(y).astype(float)
+        # R2
+        y_pred = self.predict(X)
+        ss_total = np.sum((y - np.mean(y)) ** 2)
+        ss_residual = np.sum((y - y_pred) ** 2)
+        r2_score = 1 - (ss_residual / ss_total)
+        # RMSE
+        rmse = np.sqrt(np.mean((y - y_pred) ** 2))
+        # MAE
+        mae = np.mean(np.abs(y - y_pred))
+        return r2_score, rmse, mae
+
+
+
+class RidgeRegression:
+
+    def __init__( self, learning_rate, n_epochs, l2_penality ):
+
+        self.learning_rate = learning_rate
+        self.n_epochs = n_epochs
+        self.l2_penality = l2_penality
+
+    # Function for model training
+    def fit( self, X, Y ):
+        # Assegurar arrays numpy
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+        self.m, self.n = X.shape
+        # inicialización de pesos
+        self.W = np.zeros( self.n )
+
+        self.b = 0
+        self.X = X
+        self.Y = Y
+
+        # aprendizaje por descenso de gradiente
+
+        for i in range( self.n_epochs):
+            self.update_weights()
+        return self
+
+    # actualizar pesos en descenso de gradiente
+
+    def update_weights( self ):
+        Y_pred = self.predict( self.X )
+        # calcular gradientes
+        dW = ( - ( 2 * ( self.X.T ).dot( self.Y - Y_pred ) ) +
+               ( 2 * self.l2_penality * self.W ) ) / self.m
+        db = - 2 * np.sum( self.Y - Y_pred ) / self.m
+
+        # actualizar pesos
+        self.W = self.W - self.learning_rate * dW
+        self.b = self.b - self.learning_rate * db
+        return self
+
+    # predicción
+    def predict( self, X ):
+        X = np.array(X).astype(float)
+        return X.dot( self.W ) + self.b
+
+    def score( self, X, Y ):
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+        Y_pred = self.predict( X )
+        ss_total = np.sum( ( Y - np.mean( Y ) ) ** 2 )
+        ss_residual = np.sum( ( Y - Y_pred ) ** 2 )
+        r2_score = 1 - ( ss_residual / ss_total )
+        rmse = np.sqrt( np.mean( ( Y - Y_pred ) ** 2 ) )
+        mae = np.mean( np.abs( Y - Y_pred ) )
+        return r2_score, rmse, mae
+
+
+class LassoRegressionScratch:
+    def __init__(self, learning_rate, n_epochs, l1_penalty):
+        self.learning_rate = learning_rate
+        self.n_epochs = n_epochs
+        self.l1_penalty = l1_penalty
+
+    def fit(self, X, Y):
+        # asegurar arrays numpy
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+
+        self.m, self.n = X.shape
+        self.W = np.zeros(self.n) # pesos iniciales
+        self.b = 0 # bias inicial
+        self.X = X
+        self.Y = Y
+
+        for i in range(self.n_epochs):
+            self.update_weights() # actualizar pesos
+        return self
+
+    def update_weights(self):
+        Y_pred = self.predict(self.X) # predicciones
+
+        dW = np.zeros(self.n) # gradientes
+        for j in range(self.n):
+            if self.W[j] > 0: # gradiente positivo
+                dW[j] = (-2 * (self.X[:, j]).dot(self.Y - Y_pred) +
+                         self.l1_penalty) / self.m
+            else: # gradiente negativo
+                dW[j] = (-2 * (self.X[:, j]).dot(self.Y - Y_pred) -
+                         self.l1_penalty) / self.m
+
+        db = -2 * np.sum(self.Y - Y_pred) / self.m # gradiente bias
+
+        self.W = self.W - self.learning_rate * dW # actualizar pesos
+        self.b = self.b - self.learning_rate * db # actualizar bias
+        return self
+
+    def predict(self, X):
+        X = np.array(X).astype(float)
+        return X.dot(self.W) + self.b
+
+    def score(self, X, Y):
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+        Y_pred = self.predict(X)
+        ss_total = np.sum((Y - np.mean(Y)) ** 2)
+        ss_residual = np.sum((Y - Y_pred) ** 2)
+        r2_score = 1 - (ss_residual / ss_total)
+        rmse = np.sqrt(np.mean((Y - Y_pred) ** 2))
+        mae = np.mean(np.abs(Y - Y_pred))
+        return r2_score, rmse, mae
+
+
+class ElasticRegressionScratch():
+    def __init__(self, alpha, l1_ratio, learning_rate, n_epochs):
+        self.alpha = alpha
+        self.l1_ratio = l1_ratio
+        self.learning_rate = learning_rate
+        self.n_epochs = n_epochs
+        self.l1_penalty = alpha * l1_ratio
+        self.l2_penalty = alpha * (1 - l1_ratio)
+
+    def fit(self, X, Y):
+        # asegurar arrays numpy
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+
+        self.m, self.n = X.shape
+        self.W = np.zeros(self.n)
+        self.b = 0
+        self.X = X
+        self.Y = Y
+        for i in range(self.n_epochs):
+            self.update_weights()
+        return self
+
+    def update_weights(self):
+        Y_pred = self.predict(self.X)
+        dW = np.zeros(self.n)
+        for j in range(self.n):
+            l1_grad = self.l1_penalty if self.W[j] > 0 else -self.l1_penalty # gradiente L1
+            dW[j] = ( # gradiente combinado L1 y L2
+                -2 * (self.X[:, j]).dot(self.Y - Y_pred) +
+                l1_grad + 2 * self.l2_penalty * self.W[j]
+            ) / self.m
+        db = -2 * np.sum(self.Y - Y_pred) / self.m # gradiente bias
+        self.W -= self.learning_rate * dW # actualizar pesos
+        self.b -= self.learning_rate * db # actualizar bias
+        return self
+
+    def predict(self, X):
+        X = np.array(X).astype(float)
+        return X.dot(self.W) + self.b
+
+    def score(self, X, Y):
+        X = np.array(X).astype(float)
+        Y = np.array(Y).astype(float)
+        Y_pred = self.predict(X)
+        ss_total = np.sum((Y - np.mean(Y)) ** 2)
+        ss_residual = np.sum((Y - Y_pred) ** 2)
+        r2_score = 1 - (ss_residual / ss_total)
+        rmse = np.sqrt(np.mean((Y - Y_pred) ** 2))
+        mae = np.mean(np.abs(Y - Y_pred))
+        return r2_score, rmse, mae